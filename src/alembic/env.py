@@ -1,7 +1,9 @@
 import asyncio
 import sys
+from collections.abc import MutableMapping
 from logging.config import fileConfig
 from pathlib import Path
+from typing import Literal
 
 # from sqlalchemy import pool
 from sqlalchemy.engine import Connection
@@ -16,7 +18,7 @@ from alembic import context
 sys.path.append(str(Path(__file__).resolve().parents[2] / "src"))
 
 from app.config import settings
-from app.db.models import SQLModel
+from app.db.models import FTS_TABLES, SQLModel
 from app.db.utils import new_engine
 
 # this is the Alembic Config object, which provides
@@ -40,6 +42,30 @@ target_metadata = SQLModel.metadata
 # ... etc.
 
 
+def include_name(
+    name: str | None,
+    type_: Literal[
+        "schema",
+        "table",
+        "column",
+        "index",
+        "unique_constraint",
+        "foreign_key_constraint",
+        "check_constraint",
+    ],
+    parent_names: MutableMapping[
+        Literal["schema_name", "table_name", "schema_qualified_table_name"],
+        str | None,
+    ],
+) -> bool:
+    # FTS5 虚表及其影子表、pg_trgm 索引由迁移手写维护, 不参与 autogenerate 比对
+    if type_ == "table" and name is not None:
+        return not any(name.startswith(f"{t}_fts") for t in FTS_TABLES)
+    if type_ == "index" and name is not None:
+        return not name.endswith("_trgm")
+    return True
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -56,6 +82,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_name=include_name,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -65,7 +92,11 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_name=include_name,
+    )
 
     with context.begin_transaction():
         context.run_migrations()
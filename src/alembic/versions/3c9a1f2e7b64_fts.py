@@ -0,0 +1,40 @@
+"""fts
+
+Revision ID: 3c9a1f2e7b64
+Revises: 616755e38d99
+Create Date: 2026-10-15 10:12:31.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from app.db.models import FTS_TABLES, fts_create_ddl, fts_drop_ddl
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9a1f2e7b64'
+down_revision: Union[str, Sequence[str], None] = '616755e38d99'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# 仅 SQLite: 题干与选项内容的 FTS5 trigram 索引, 由触发器与原表同步
+# DDL 与 create_all 共用 app.db.models 中的同一份定义
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for name in FTS_TABLES:
+        for stmt in fts_create_ddl(name):
+            op.execute(stmt)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for name in FTS_TABLES:
+        for stmt in fts_drop_ddl(name):
+            op.execute(stmt)
@@ -0,0 +1,47 @@
+"""pg_trgm
+
+Revision ID: 8f2d4b6a1c37
+Revises: 3c9a1f2e7b64
+Create Date: 2026-10-15 14:03:52.718260
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f2d4b6a1c37'
+down_revision: Union[str, Sequence[str], None] = '3c9a1f2e7b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# 仅 PostgreSQL: 题干与选项内容的 trigram GIN 索引, 让 ILIKE '%kw%' 走索引
+# 与 SQLite 的 FTS5 trigram 同一思路, 中文子串同样可用
+TRGM_INDEXES = {
+    'ix_problem_content_trgm': 'problem',
+    'ix_option_content_trgm': 'option',
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for index, table in TRGM_INDEXES.items():
+        op.create_index(
+            index,
+            table,
+            ['content'],
+            postgresql_using='gin',
+            postgresql_ops={'content': 'gin_trgm_ops'},
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for index, table in TRGM_INDEXES.items():
+        op.drop_index(index, table_name=table)
@@ -23,11 +23,18 @@ speedlimit_descriptor: RateLimitItem = parse_limit("6/minute")
 async def get_session_dependency() -> AsyncGenerator[AsyncSession, None]:
     if session_getter is None:
         raise RuntimeError("inject session_getter first")
+    # 一个请求一个事务, 由这里统一提交: 依赖中的查询已自动开启事务,
+    # 之后各操作的写入都嵌套在其中 (SAVEPOINT), 请求正常处理完才一并生效;
+    # 抛出异常 (含 HTTPException) 时不再提交, 未提交的写入随会话关闭回滚
     async with session_getter() as session:
         yield session
+        await session.commit()
 
 
-DbSessionDep = Annotated[AsyncSession, Depends(get_session_dependency)]
+# scope="function": 在发送响应前提交, 提交失败时客户端能收到错误
+DbSessionDep = Annotated[
+    AsyncSession, Depends(get_session_dependency, scope="function")
+]
 
 
 async def _speedlimit_entrance(request: Request) -> Request:
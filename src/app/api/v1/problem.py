@@ -2,7 +2,7 @@ import logging
 from typing import Literal
 from uuid import UUID
 
-from fastapi import APIRouter, Body, HTTPException, Query
+from fastapi import APIRouter, Body, Header, HTTPException, Query, Response
 
 from app.api.deps import DbSessionDep, LoginRequired, RequireRoles
 from app.db.models import UserRole
@@ -11,6 +11,7 @@ from app.db.operations import (
     create_problemset,
     delete_problems,
     get_problem_count,
+    get_problemset_list_version,
     list_problemset,
     sample,
     search_problem,
@@ -42,8 +43,24 @@ async def create_problem_set(
     return ProblemSetCreateResponse(id=id_, status=status)
 
 
-@router.get("/list_set", summary="列出现有的题目集")
-async def list_set(session: DbSessionDep, _: LoginRequired) -> list[ProblemSetResponse]:
+@router.get(
+    "/list_set",
+    summary="列出现有的题目集",
+    description="响应带有 ETag, 携带 If-None-Match 请求且列表未变化时返回 304",
+)
+async def list_set(
+    session: DbSessionDep,
+    _: LoginRequired,
+    response: Response,
+    if_none_match: str = Header(""),
+) -> list[ProblemSetResponse]:
+    etag = f'W/"{await get_problemset_list_version(session)}"'
+    # If-None-Match 用弱比较, 忽略 W/ 前缀; "*" 匹配任何现存的表示
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if "*" in tags or etag.removeprefix("W/") in tags:
+        raise HTTPException(304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
     return await list_problemset(session)
 
 
@@ -67,7 +84,8 @@ async def add(
 @router.get(
     "/search",
     summary="搜索题目",
-    description="""kw 可留空, 此时不进行关键词筛选""",
+    description="""kw 可留空, 此时不进行关键词筛选;
+结果按 id 排序, 给出 after_id (上一页最后一题的 id) 时按其翻页, 忽略 page""",
 )
 async def search(
     session: DbSessionDep,
@@ -76,6 +94,7 @@ async def search(
     problemset_id: UUID | None = Query(None),
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1),
+    after_id: UUID | None = Query(None),
 ) -> list[ProblemResponse]:
     return await search_problem(
         session,
@@ -83,6 +102,7 @@ async def search(
         problemset_id=problemset_id,
         page=max(page, 1),
         page_size=max(page_size, 1),
+        after_id=after_id,
     )
 
 
@@ -97,6 +117,7 @@ async def get_problems(
     problemset_id: UUID | None = Query(None),
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1),
+    after_id: UUID | None = Query(None),
 ) -> list[ProblemResponse]:
     return await search_problem(
         session,
@@ -104,6 +125,7 @@ async def get_problems(
         problemset_id=problemset_id,
         page=max(page, 1),
         page_size=max(page_size, 1),
+        after_id=after_id,
     )
 
 
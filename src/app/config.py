@@ -8,6 +8,8 @@ class Settings(BaseSettings):
 
     database_url: str = INMEM_SQLITE_URL
     test_database_url: str = INMEM_SQLITE_URL
+    # 密码哈希线程数, 不设置则按 CPU 核数和物理内存推算
+    argon2_max_workers: int | None = None
 
 
 settings = Settings()
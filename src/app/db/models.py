@@ -1,10 +1,10 @@
 from datetime import datetime, timedelta
 from enum import StrEnum, auto
-from typing import TYPE_CHECKING, Awaitable, Generic
+from typing import TYPE_CHECKING, Any, Awaitable, Generic
 from uuid import UUID, uuid4
 
 from pydantic import EmailStr
-from sqlalchemy import PrimaryKeyConstraint
+from sqlalchemy import Connection, PrimaryKeyConstraint, column, event, table
 from sqlalchemy.ext.asyncio.session import AsyncAttrs as _AsyncAttrs
 from sqlmodel import Field, Relationship, SQLModel
 
@@ -39,6 +39,7 @@ class DBOption(SQLModel, AsyncAttrs[_OptionAsyncAttrs], table=True):
 
     problem_id: UUID = Field(
         foreign_key="problem.id",
+        index=True,
         # sa_column_kwargs={"ondelete": "CASCADE"},
     )
     problem: "DBProblem" = Relationship(back_populates="options")
@@ -55,7 +56,7 @@ class DBProblem(SQLModel, AsyncAttrs[_ProblemAsyncAttrs], table=True):
     content: str
     type: ProblemType
 
-    problemset_id: UUID = Field(foreign_key="problemset.id")
+    problemset_id: UUID = Field(foreign_key="problemset.id", index=True)
     problemset: "DBProblemSet" = Relationship(back_populates="problems")
     options: list[DBOption] = Relationship(
         back_populates="problem",
@@ -147,3 +148,67 @@ TABLES = [
         LoginSession,
     )
 ]
+
+
+# SQLite 下为题干和选项内容建立 FTS5 全文索引, 由触发器与原表同步
+# 用 trigram 分词: 中文没有空格分词, unicode61 只能整句匹配, trigram 才能做任意子串检索
+# trigram 索引可直接服务 LIKE '%kw%', 大小写不敏感; 但不足 3 个字符的 kw 查不到任何结果
+# 原表主键是 UUID, 其隐式 rowid 会被 VACUUM 或整表重建重排, 不能拿来关联索引;
+# 因此另建 {name}_fts_id 表, 用它自己的 INTEGER PRIMARY KEY (不会被重排) 对应原表 id
+FTS_MIN_KEYWORD_LENGTH = 3
+FTS_TABLES = {
+    name: table(f"{name}_fts", column("rowid"), column("content"))
+    for name in (DBProblem.__tablename__, DBOption.__tablename__)
+}
+FTS_ID_TABLES = {
+    name: table(f"{name}_fts_id", column("rowid"), column("id")) for name in FTS_TABLES
+}
+
+
+def fts_create_ddl(name: str) -> list[str]:
+    """建立 name 表的全文索引和同步触发器, 并为已有数据补建索引; 迁移中也用它"""
+    fts, ids = f"{name}_fts", f"{name}_fts_id"
+    return [
+        f"CREATE TABLE IF NOT EXISTS {ids} (rowid INTEGER PRIMARY KEY, id NOT NULL UNIQUE)",
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(content, tokenize='trigram')",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON "{name}" BEGIN '
+        f"INSERT INTO {ids}(id) VALUES (new.id); "
+        f"INSERT INTO {fts}(rowid, content) VALUES (last_insert_rowid(), new.content); "
+        "END",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON "{name}" BEGIN '
+        f"DELETE FROM {fts} WHERE rowid = (SELECT rowid FROM {ids} WHERE id = old.id); "
+        f"DELETE FROM {ids} WHERE id = old.id; END",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF content ON "{name}" '
+        f"BEGIN UPDATE {fts} SET content = new.content "
+        f"WHERE rowid = (SELECT rowid FROM {ids} WHERE id = new.id); END",
+        f'INSERT INTO {ids}(id) SELECT id FROM "{name}" '
+        f"WHERE id NOT IN (SELECT id FROM {ids})",
+        f"INSERT INTO {fts}(rowid, content) SELECT i.rowid, t.content "
+        f'FROM {ids} AS i JOIN "{name}" AS t ON t.id = i.id '
+        f"WHERE i.rowid NOT IN (SELECT rowid FROM {fts})",
+    ]
+
+
+def fts_drop_ddl(name: str) -> list[str]:
+    fts = f"{name}_fts"
+    return [
+        *(f"DROP TRIGGER IF EXISTS {fts}_{suffix}" for suffix in ("ai", "ad", "au")),
+        f"DROP TABLE IF EXISTS {fts}",
+        f"DROP TABLE IF EXISTS {fts}_id",
+    ]
+
+
+@event.listens_for(SQLModel.metadata, "after_create")
+def _create_fts(_: Any, connection: Connection, **__: Any) -> None:
+    if connection.dialect.name == "sqlite":
+        for name in FTS_TABLES:
+            for stmt in fts_create_ddl(name):
+                connection.exec_driver_sql(stmt)
+
+
+@event.listens_for(SQLModel.metadata, "before_drop")
+def _drop_fts(_: Any, connection: Connection, **__: Any) -> None:
+    if connection.dialect.name == "sqlite":
+        for name in FTS_TABLES:
+            for stmt in fts_drop_ddl(name):
+                connection.exec_driver_sql(stmt)
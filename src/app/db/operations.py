@@ -1,15 +1,21 @@
+import hashlib
 import logging
+import random
+import unicodedata
+from collections.abc import Iterable
 from datetime import datetime, timedelta
 from typing import Any, cast, overload
 from uuid import UUID, uuid4
 
+from sqlalchemy import Select
 from sqlalchemy.orm import QueryableAttribute, selectinload
-from sqlmodel import col, delete, func, or_, select
+from sqlmodel import col, delete, func, insert, or_, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.db.decos import in_transaction
-from app.schemas.request import ProblemSubmit
+from app.schemas.request import PROBLEM_SUBMIT_LIST_ADAPTER, ProblemSubmit
 from app.schemas.response import (
+    PROBLEM_RESPONSE_LIST_ADAPTER,
     ProblemResponse,
     ProblemSetCreateStatus,
     ProblemSetResponse,
@@ -17,9 +23,13 @@ from app.schemas.response import (
 from app.typ import T
 from app.utils.misc import utcnow
 from app.utils.security import hash, sha256, verify
+from app.utils.uuid7 import uuid7
 
 from .models import (
     ACCESS_TOKEN_LIFETIME,
+    FTS_ID_TABLES,
+    FTS_MIN_KEYWORD_LENGTH,
+    FTS_TABLES,
     DBAnswerRecord,
     DBOption,
     DBProblem,
@@ -53,6 +63,31 @@ async def create_problemset(
     return problemset.id, ProblemSetCreateStatus.SUCCESS
 
 
+def _to_db_rows(
+    problemset_id: UUID, problem: ProblemSubmit
+) -> tuple[dict[str, Any], list[dict[str, Any]]]:
+    # 入参已由 pydantic 校验过, 直接拼行数据; 主键在这里生成, 无需 RETURNING 取回
+    # 文本统一存为 NFC, 与 search_problem 对关键词的处理一致, 否则 NFD 输入会匹配不上
+    problem_id = uuid7()
+    problem_row = {
+        "id": problem_id,
+        "content": unicodedata.normalize("NFC", problem.content),
+        "type": problem.type,
+        "problemset_id": problemset_id,
+    }
+    option_rows = [
+        {
+            "id": uuid7(),
+            "content": unicodedata.normalize("NFC", o.content),
+            "order": o.order,
+            "is_correct": o.is_correct,
+            "problem_id": problem_id,
+        }
+        for o in problem.options
+    ]
+    return problem_row, option_rows
+
+
 @in_transaction()
 async def add_problems(
     session: AsyncSession, problemset_id: UUID, *problems: ProblemSubmit
@@ -62,26 +97,18 @@ async def add_problems(
     ).one_or_none()
     if problemset is None:
         return None
-    added_ids: list[UUID] = []
+    problem_rows: list[dict[str, Any]] = []
+    option_rows: list[dict[str, Any]] = []
     for problem in problems:
-        problem_db = DBProblem.model_validate(
-            problem,
-            update={
-                "options": [],
-                "problemset_id": problemset.id,
-                "problemset": problemset,
-            },
-        )
-        problem_id = problem_db.id
-        options_db = [
-            DBOption.model_validate(o, update={"problem_id": problem_db.id})
-            for o in problem.options
-        ]
-        problem_db.options = options_db
-        session.add_all([problem_db, *options_db])
-        added_ids.append(problem_id)
-
-    return added_ids
+        problem_row, rows = _to_db_rows(problemset.id, problem)
+        problem_rows.append(problem_row)
+        option_rows.extend(rows)
+    # 每张表一条 executemany, 不经过 unit of work 逐个对象记账
+    if problem_rows:
+        await session.exec(insert(DBProblem), params=problem_rows)
+    if option_rows:
+        await session.exec(insert(DBOption), params=option_rows)
+    return [row["id"] for row in problem_rows]
 
 
 async def query_problem(
@@ -102,36 +129,89 @@ async def query_problem(
     )
 
 
+async def query_problems(
+    session: AsyncSession, *problem_ids: UUID
+) -> list[ProblemResponse]:
+    """一次查询多道题, 不存在的 id 直接略过; not public"""
+    db_problems = (
+        await session.exec(
+            select(DBProblem)
+            .where(col(DBProblem.id).in_(problem_ids))
+            .options(selectinload(queryable(DBProblem.options)))
+        )
+    ).all()
+    return PROBLEM_RESPONSE_LIST_ADAPTER.validate_python(
+        db_problems, from_attributes=True
+    )
+
+
+def _is_sqlite(session: AsyncSession) -> bool:
+    return session.get_bind().dialect.name == "sqlite"
+
+
+def _fts_hits(name: str, pattern: str) -> Select[tuple[Any]]:
+    """name 表中内容匹配 pattern 的行的 id, 经全文索引查出"""
+    fts, ids = FTS_TABLES[name], FTS_ID_TABLES[name]
+    return select(ids.c.id).where(
+        ids.c.rowid.in_(select(fts.c.rowid).where(fts.c.content.like(pattern)))
+    )
+
+
 async def search_problem(
     session: AsyncSession,
     kw: str | None = None,
     problemset_id: UUID | None = None,
     page: int = 1,
     page_size: int = 20,
+    after_id: UUID | None = None,
 ) -> list[ProblemResponse]:
+    """
+    结果始终按 id 排序 (uuid7, 即大致按添加时间), OFFSET 分页因此是确定的.
+    给出 after_id 时改用 keyset 分页: 只取 id 大于它的一页, 忽略 page, 不必跳过前面的行.
+    各检索路径都只筛选 problem 的行而不做 distinct, 排序和 id > after_id 可直接走主键索引
+    """
     stmt = select(DBProblem)
     if problemset_id:
         stmt = stmt.where(DBProblem.problemset_id == problemset_id)
     if kw:
-        stmt = (
-            stmt.outerjoin(DBOption)
-            .filter(
-                or_(
-                    col(DBProblem.content).icontains(kw),
-                    col(DBOption.content).icontains(kw),
-                )
+        kw = unicodedata.normalize("NFC", kw)
+    if kw and len(kw) >= FTS_MIN_KEYWORD_LENGTH and _is_sqlite(session):
+        # 走 FTS5 trigram 索引, 同时省掉 outerjoin + distinct
+        pattern = f"%{kw}%"
+        stmt = stmt.where(
+            or_(
+                col(DBProblem.id).in_(_fts_hits(DBProblem.__tablename__, pattern)),
+                col(DBProblem.id).in_(
+                    select(DBOption.problem_id).where(
+                        col(DBOption.id).in_(_fts_hits(DBOption.__tablename__, pattern))
+                    )
+                ),
+            )
+        )
+    elif kw:
+        # 与 FTS 路径同样用子查询匹配选项, 不用 outerjoin + distinct;
+        # PostgreSQL 下两处 ILIKE 各自可走 pg_trgm 索引
+        stmt = stmt.where(
+            or_(
+                col(DBProblem.content).icontains(kw),
+                col(DBProblem.id).in_(
+                    select(DBOption.problem_id).where(
+                        col(DBOption.content).icontains(kw)
+                    )
+                ),
             )
-            .distinct()
         )
-    stmt = stmt.offset(page_size * (page - 1)).limit(page_size)
+    if after_id is not None:
+        stmt = stmt.where(DBProblem.id > after_id)
+    else:
+        stmt = stmt.offset(page_size * (page - 1))
+    stmt = stmt.order_by(col(DBProblem.id)).limit(page_size)
     db_problems = (
         await session.exec(stmt.options(selectinload(queryable(DBProblem.options))))
     ).all()
-    result: list[ProblemResponse] = []
-    for p in db_problems:
-        result.append(ProblemResponse.model_validate(p, from_attributes=True))
-
-    return result
+    return PROBLEM_RESPONSE_LIST_ADAPTER.validate_python(
+        db_problems, from_attributes=True
+    )
 
 
 @in_transaction()
@@ -173,14 +253,27 @@ async def get_problem_count(
 async def sample(
     session: AsyncSession, problemset_id: UUID, n: int = 20
 ) -> list[ProblemSubmit]:
-    db_problems = await session.exec(
-        select(DBProblem)
+    # 先只对 id 随机排序取 n 个 (走 problemset_id 索引, 排序时不搬整行), 再按 id 取整行
+    sampled_ids = (
+        select(DBProblem.id)
         .where(DBProblem.problemset_id == problemset_id)
         .order_by(func.random())
         .limit(n)
-        .options(selectinload(queryable(DBProblem.options)))
     )
-    return [ProblemSubmit.model_validate(p, from_attributes=True) for p in db_problems]
+    db_problems = list(
+        (
+            await session.exec(
+                select(DBProblem)
+                .where(col(DBProblem.id).in_(sampled_ids))
+                .options(selectinload(queryable(DBProblem.options)))
+            )
+        ).all()
+    )
+    # IN 查询不保证顺序, 重新打乱
+    random.shuffle(db_problems)
+    return PROBLEM_SUBMIT_LIST_ADAPTER.validate_python(
+        db_problems, from_attributes=True
+    )
 
 
 async def list_problemset(session: AsyncSession) -> list[ProblemSetResponse]:
@@ -197,13 +290,41 @@ async def list_problemset(session: AsyncSession) -> list[ProblemSetResponse]:
     ]
 
 
+async def get_problemset_list_version(session: AsyncSession) -> str:
+    """
+    题目集列表的版本标识, 任何题目集或题目的增删都会改变它.
+    新增会抬高最大 ID, 删除会减少行数, 两者合起来即可判断变化.
+    前提是主键 UUIDv7 在所有进程间单调递增, 即各实例时钟一致且不回拨;
+    否则同时发生的一增一删可能恰好抵消, 列表要到下一次变化才会更新.
+    最大 ID 用倒序取第一行得到, 可直接走主键索引, 不必扫描全表
+    """
+
+    def newest_id(model: type[DBProblemSet] | type[DBProblem]) -> Any:
+        return (
+            select(model.id).order_by(col(model.id).desc()).limit(1).scalar_subquery()
+        )
+
+    row = (
+        await session.exec(
+            select(
+                select(func.count()).select_from(DBProblemSet).scalar_subquery(),
+                newest_id(DBProblemSet),
+                select(func.count()).select_from(DBProblem).scalar_subquery(),
+                newest_id(DBProblem),
+            )
+        )
+    ).one()
+    return hashlib.sha1(repr(tuple(row)).encode("utf-8")).hexdigest()
+
+
 @in_transaction()
 async def delete_all(session: AsyncSession) -> None:
+    # 先删引用方再删被引用方, 外键约束生效时也不会报错
+    tables = (DBOption, DBProblem, DBProblemSet)
     # 加 type: ignore 的原因是:
     # https://github.com/fastapi/sqlmodel/issues/909
-    await session.exec(delete(DBProblemSet))  # type: ignore
-    await session.exec(delete(DBProblem))  # type: ignore
-    await session.exec(delete(DBOption))  # type: ignore
+    for table in tables:
+        await session.exec(delete(table))  # type: ignore
 
 
 @overload
@@ -260,23 +381,53 @@ async def report_attempt(
     correct: bool,
     time: datetime | None = None,
 ) -> None:
-    if (
-        record := (
+    await _report_attempts(session, user_id, [(problem_id, correct)], time)
+
+
+@in_transaction()
+async def report_attempts(
+    session: AsyncSession,
+    user_id: UUID,
+    attempts: Iterable[tuple[UUID, bool]],
+    time: datetime | None = None,
+) -> None:
+    """一次上报多道题的答题情况, attempts 为 (problem_id, correct)"""
+    await _report_attempts(session, user_id, attempts, time)
+
+
+async def _report_attempts(
+    session: AsyncSession,
+    user_id: UUID,
+    attempts: Iterable[tuple[UUID, bool]],
+    time: datetime | None,
+) -> None:
+    # 先按题目汇总, 每道题只查一次、写一次
+    tally: dict[UUID, tuple[int, int]] = {}
+    for problem_id, correct in attempts:
+        correct_count, total_count = tally.get(problem_id, (0, 0))
+        tally[problem_id] = (correct_count + correct, total_count + 1)
+    if not tally:
+        return
+    records = {
+        record.problem_id: record
+        for record in (
             await session.exec(
                 select(DBAnswerRecord).where(
                     DBAnswerRecord.user_id == user_id,
-                    DBAnswerRecord.problem_id == problem_id,
+                    col(DBAnswerRecord.problem_id).in_(tally),
                 )
             )
-        ).one_or_none()
-    ) is None:
-        record = DBAnswerRecord(user_id=user_id, problem_id=problem_id)
-
-    record.total_count += 1
-    if correct:
-        record.correct_count += 1
-    record.last_attempt = time or utcnow()
-    session.add(record)
+        ).all()
+    }
+    last_attempt = time or utcnow()
+    for problem_id, (correct_count, total_count) in tally.items():
+        record = records.get(problem_id) or DBAnswerRecord(
+            user_id=user_id, problem_id=problem_id
+        )
+        record.correct_count += correct_count
+        record.total_count += total_count
+        record.last_attempt = last_attempt
+        session.add(record)
 
 
 async def query_statistic(
@@ -1,24 +1,25 @@
 import functools
 from collections.abc import AsyncGenerator, Callable
 from contextlib import asynccontextmanager
-from typing import Any, Concatenate
+from typing import Any
 
-from sqlalchemy import URL
+from sqlalchemy import URL, Connection, event, make_url
 from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlalchemy.ext.asyncio.session import AsyncSessionTransaction
-from sqlalchemy.orm import Session
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.typ import AsyncCallable, P, T
-
 
 @asynccontextmanager
 async def auto_begin(
     session: AsyncSession, auto_rollback: bool = True
 ) -> AsyncGenerator[AsyncSessionTransaction, None]:
-    nested = session.in_transaction()
+    if not session.in_transaction():
+        # begin() 的上下文管理器在异常时会自行回滚, 无需再手动 rollback
+        async with session.begin() as t:
+            yield t
+        return
 
-    async with (session.begin_nested if nested else session.begin)() as t:
+    async with session.begin_nested() as t:
         try:
             yield t
         except Exception:
@@ -27,22 +28,6 @@ async def auto_begin(
             raise
 
 
-def to_async(
-    maker: Callable[[], AsyncSession],
-) -> Callable[[Callable[Concatenate[Session, P], T]], AsyncCallable[P, T]]:
-    def deco(func: Callable[Concatenate[Session, P], T]) -> AsyncCallable[P, T]:
-        """将执行第一个参数是 Session 的同步函数装饰成异步函数, 运行时会单开一个 AsyncSession"""
-
-        @functools.wraps(func)
-        async def wrapped(*args: P.args, **kwargs: P.kwargs) -> T:
-            async with maker() as asess:
-                return await asess.run_sync(func, *args, **kwargs)
-
-        return wrapped
-
-    return deco
-
-
 def get_session(
     engine: AsyncEngine,
     autoflush: bool = False,
@@ -69,5 +54,31 @@ def new_session_getter(
     )
 
 
+def _use_explicit_sqlite_transactions(engine: AsyncEngine) -> None:
+    """
+    sqlite3 驱动会推迟 BEGIN 到第一条写语句前, 导致 SAVEPOINT 在事务外执行、RELEASE 即提交.
+    请求中的写入都是嵌套在请求事务里的 SAVEPOINT (见 auto_begin), 不修正的话会在 RELEASE 时提前提交,
+    请求随后出错也回滚不了, 所以生产环境同样需要.
+    这里关闭驱动自身的事务管理, 改由 SQLAlchemy 显式发出 BEGIN.
+    见 https://docs.sqlalchemy.org/en/20/dialects/sqlite.html#serializable-isolation-savepoints-transactional-ddl
+    """
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def on_connect(dbapi_connection: Any, _: Any) -> None:
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine.sync_engine, "begin")
+    def on_begin(conn: Connection) -> None:
+        conn.exec_driver_sql("BEGIN")
+
+
 def new_engine(url: str | URL, echo: bool = False, **kwargs: Any) -> AsyncEngine:
-    return create_async_engine(url, echo=echo, **kwargs)
+    if make_url(url).get_backend_name() != "sqlite":
+        # 网络数据库的连接可能被服务端或中间设备断开, 取用前探活并定期回收
+        # SQLite 保持 SQLAlchemy 的默认: 内存库用 StaticPool, 文件库用队列池复用连接
+        kwargs.setdefault("pool_pre_ping", True)
+        kwargs.setdefault("pool_recycle", 1800)
+    engine = create_async_engine(url, echo=echo, **kwargs)
+    if engine.dialect.name == "sqlite":
+        _use_explicit_sqlite_transactions(engine)
+    return engine
@@ -1,5 +1,6 @@
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -24,13 +25,35 @@ app.include_router(api_router, prefix="/api")
 
 
 PROD_ORIGINS: list[str] = []
-DEV_ORIGIN_REGEX = r"^https?://(localhost|127\.0\.0\.1|0\.0\.0\.0|\[::1\])(:\d+)?$"
+DEV_ORIGIN_SCHEMES = frozenset({"http", "https"})
+DEV_ORIGIN_HOSTS = frozenset({"localhost", "127.0.0.1", "0.0.0.0", "::1"})
+
+
+class DevCORSMiddleware(CORSMiddleware):
+    """放行本机任意端口的开发前端, 用集合查找代替逐请求的正则匹配"""
+
+    def is_allowed_origin(self, origin: str) -> bool:
+        if super().is_allowed_origin(origin):
+            return True
+        try:
+            parsed = urlsplit(origin)
+            _ = parsed.port  # 端口非法时抛出 ValueError
+        except ValueError:
+            return False
+        return (
+            parsed.scheme in DEV_ORIGIN_SCHEMES
+            and parsed.hostname in DEV_ORIGIN_HOSTS
+            and not (parsed.path or parsed.query or parsed.fragment)
+            and parsed.username is None
+            and parsed.password is None
+        )
+
+
 app.add_middleware(
-    CORSMiddleware,
+    DevCORSMiddleware,
     allow_origins=PROD_ORIGINS,
-    allow_origin_regex=DEV_ORIGIN_REGEX,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    max_age=600,
+    max_age=86400,
 )
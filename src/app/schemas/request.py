@@ -1,6 +1,6 @@
 from uuid import UUID
 
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 
 from ._base import BaseOption, BaseProblem, BaseProblemSet, BaseUser
 
@@ -38,3 +38,6 @@ class LoginByUserIdSubmit(BaseModel):
 
 class RefreshTokenSubmit(BaseModel):
     refresh_token: UUID
+
+
+PROBLEM_SUBMIT_LIST_ADAPTER = TypeAdapter(list[ProblemSubmit])
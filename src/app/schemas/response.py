@@ -1,7 +1,7 @@
 from enum import StrEnum, auto
 from uuid import UUID
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
 
 from app.db.models import UserRole
 
@@ -67,3 +67,7 @@ class RefreshTokenResponse(BaseModel):
 class LoginSuccessResponse(BaseModel):
     access_token: UUID
     refresh_token: UUID
+
+
+# 列表校验器在导入时构建一次, 批量转换 ORM 对象时复用, 省去逐个 model_validate
+PROBLEM_RESPONSE_LIST_ADAPTER = TypeAdapter(list[ProblemResponse])
@@ -1,19 +1,25 @@
 import asyncio
 import functools
+import threading
 from collections.abc import Callable
-from typing import Any, cast
+from concurrent.futures import Executor
 
-from app.typ import AsyncCallable, P, T
-
-_SINGLETON_MAP: dict[Any, Any] = {}
+from app.typ import AsyncCallable, P, T, VoidType
 
 
 def singleton(cls: Callable[P, T]) -> Callable[P, T]:
+    # 实例存在闭包里, 命中时只有一次比较; 仅在未创建时加锁, 避免并发启动时重复实例化
+    instance: T | VoidType = VoidType.VOID
+    lock = threading.Lock()
+
     @functools.wraps(cls)
     def wrapped(*args: P.args, **kwargs: P.kwargs) -> T:
-        if cls not in _SINGLETON_MAP:
-            _SINGLETON_MAP[cls] = cls(*args, **kwargs)
-        return cast(T, _SINGLETON_MAP[cls])
+        nonlocal instance
+        if instance is VoidType.VOID:
+            with lock:
+                if instance is VoidType.VOID:
+                    instance = cls(*args, **kwargs)
+        return instance
 
     return wrapped
 
@@ -24,3 +30,20 @@ def in_thread(func: Callable[P, T]) -> AsyncCallable[P, T]:
         return await asyncio.to_thread(func, *args, **kwargs)
 
     return wrapper
+
+
+def in_executor(
+    executor: Executor | None,
+) -> Callable[[Callable[P, T]], AsyncCallable[P, T]]:
+    """同 in_thread, 但提交到指定的 executor, 为 None 时使用事件循环的默认 executor"""
+
+    def deco(func: Callable[P, T]) -> AsyncCallable[P, T]:
+        @functools.wraps(func)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
+            return await asyncio.get_running_loop().run_in_executor(
+                executor, functools.partial(func, *args, **kwargs)
+            )
+
+        return wrapper
+
+    return deco
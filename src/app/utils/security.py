@@ -1,21 +1,44 @@
 import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
 from argon2 import PasswordHasher
 from argon2.exceptions import VerifyMismatchError
 from argon2.profiles import RFC_9106_LOW_MEMORY
 
-from .decos import in_thread
+from app.config import settings
+
+from .decos import in_executor, in_thread
 
 hasher = PasswordHasher.from_parameters(RFC_9106_LOW_MEMORY)
 
 
-@in_thread
+def _argon2_max_workers() -> int:
+    if settings.argon2_max_workers is not None:
+        return max(1, settings.argon2_max_workers)
+    # 每次哈希占用 memory_cost KiB 内存, 线程数同时受 CPU 核数和物理内存限制
+    # 取物理内存总量而非导入时的空闲内存: 后者只是一时的快照, 还不含可回收的页缓存
+    cpus = os.cpu_count() or 1
+    try:
+        physical_kib = os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (AttributeError, ValueError, OSError):
+        return cpus
+    return max(1, min(cpus, physical_kib // hasher.memory_cost))
+
+
+# 独立的线程池, 避免和默认 executor 中其他阻塞调用互相争抢
+argon2_executor = ThreadPoolExecutor(
+    max_workers=_argon2_max_workers(), thread_name_prefix="argon2"
+)
+
+
+@in_executor(argon2_executor)
 def hash(password: str | bytes) -> str:
     return hasher.hash(password)
 
 
-@in_thread
+@in_executor(argon2_executor)
 def verify(hashed: str | bytes, password: str | bytes) -> bool:
     try:
         hasher.verify(hashed, password)
@@ -1,46 +1,150 @@
-import functools
-from collections.abc import AsyncGenerator
+import asyncio
+import os
+from collections.abc import AsyncGenerator, Generator
+from pathlib import Path
+from typing import Any
 
 import pytest
+from argon2 import PasswordHasher
+from argon2.profiles import CHEAPEST
 from httpx import ASGITransport, AsyncClient
+from sqlalchemy import URL, event, make_url
+from sqlalchemy.ext.asyncio import AsyncConnection
 from sqlalchemy.ext.asyncio.engine import AsyncEngine
 from sqlmodel import SQLModel
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.api import deps
-from app.config import INMEM_SQLITE_URL
-from app.db.utils import get_session, new_engine
+from app.config import settings
+from app.db.utils import new_engine
 from app.main import app
 from app.typ import SessionGetterType
+from app.utils import security
 
+try:
+    import uvloop
+except ImportError:  # Windows 上没有 uvloop
+    pass
+else:
+    # 在任何异步 fixture 创建事件循环之前切换策略
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 
-@pytest.fixture(scope="module", autouse=True, name="test_engine")
+
+class SerializedSession(AsyncSession):
+    """绑定在同一连接上的会话, 进入时排队, 避免并发会话交错使用 SAVEPOINT"""
+
+    def __init__(self, lock: asyncio.Lock, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._lock = lock
+
+    async def __aenter__(self) -> "SerializedSession":
+        await self._lock.acquire()
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        try:
+            await super().__aexit__(*args)
+        finally:
+            self._lock.release()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def fast_password_hasher() -> Generator[None]:
+    """测试里密码哈希只需要能用, 换成最低参数的 argon2; PYTEST_FAST_HASH=0 时保持原样"""
+    if os.environ.get("PYTEST_FAST_HASH", "1") == "0":
+        yield
+        return
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(security, "hasher", PasswordHasher.from_parameters(CHEAPEST))
+        yield
+
+
+def _worker_database_url(url: str) -> str | URL:
+    """xdist 下每个 worker 各用一个 SQLite 文件, 内存库本就按进程隔离"""
+    worker = os.environ.get("PYTEST_XDIST_WORKER")
+    parsed = make_url(url)
+    if (
+        worker is None
+        or parsed.get_backend_name() != "sqlite"
+        or parsed.database in (None, "", ":memory:")
+    ):
+        return url
+    path = Path(parsed.database)
+    return parsed.set(database=str(path.with_stem(f"{path.stem}_{worker}")))
+
+
+def _relax_sqlite_durability(engine: AsyncEngine) -> None:
+    """测试数据用完即弃, 不需要每次提交都 fsync; 仅对测试引擎生效, 不影响生产配置"""
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def on_connect(dbapi_connection: Any, _: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA synchronous=OFF")
+        cursor.execute("PRAGMA journal_mode=MEMORY")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+
+@pytest.fixture(scope="session", autouse=True, name="test_engine")
 async def test_engine() -> AsyncGenerator[AsyncEngine]:
-    engine = new_engine(INMEM_SQLITE_URL)
+    # 默认是内存 SQLite, 可通过 TEST_DATABASE_URL 换成其他数据库
+    # 默认不回显 SQL, 排查问题时用 TEST_SQL_ECHO=1 打开
+    engine = new_engine(
+        _worker_database_url(settings.test_database_url),
+        echo=os.environ.get("TEST_SQL_ECHO", "0") == "1",
+    )
+    if engine.dialect.name == "sqlite":
+        _relax_sqlite_durability(engine)
     async with engine.begin() as conn:
         await conn.run_sync(SQLModel.metadata.create_all)
     yield engine
     async with engine.begin() as conn:
         await conn.run_sync(SQLModel.metadata.drop_all)
+    await engine.dispose()
 
 
-@pytest.fixture(scope="module")
-def test_session_getter(test_engine: AsyncEngine) -> SessionGetterType:
-    return functools.partial(get_session, engine=test_engine)
+@pytest.fixture
+async def test_connection(
+    test_engine: AsyncEngine,
+) -> AsyncGenerator[AsyncConnection]:
+    """每个测试都运行在一个外层事务里, 结束时整体回滚, 不用再逐表清理"""
+    async with test_engine.connect() as conn:
+        trans = await conn.begin()
+        yield conn
+        await trans.rollback()
 
 
-@pytest.fixture(scope="module")
-async def test_client(test_engine: AsyncEngine) -> AsyncGenerator[AsyncClient, None]:
-    """创建测试客户端"""
+@pytest.fixture
+def test_session_getter(test_connection: AsyncConnection) -> SessionGetterType:
+    lock = asyncio.Lock()
+
+    def getter() -> AsyncSession:
+        # 会话内的 commit 只会释放 SAVEPOINT, 外层事务保持不变
+        return SerializedSession(
+            lock,
+            bind=test_connection,
+            autoflush=False,
+            expire_on_commit=False,
+            join_transaction_mode="create_savepoint",
+        )
 
-    async def get_test_session_override() -> AsyncGenerator[AsyncSession]:
-        async with get_session(test_engine) as session:
-            yield session
+    return getter
 
+
+@pytest.fixture(autouse=True)
+def inject_session_getter(
+    test_session_getter: SessionGetterType,
+) -> Generator[None]:
+    deps.session_getter = test_session_getter
+    yield
+    deps.session_getter = None
+
+
+@pytest.fixture(scope="session")
+async def test_client() -> AsyncGenerator[AsyncClient, None]:
+    """创建测试客户端"""
     deps.speedlimiter = None
-    app.dependency_overrides[deps.get_session_dependency] = get_test_session_override
     async with AsyncClient(
         transport=ASGITransport(app=app), base_url="http://test"
     ) as ac:
         yield ac
-    app.dependency_overrides.clear()
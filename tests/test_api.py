@@ -1,15 +1,26 @@
+import asyncio
 from collections.abc import AsyncGenerator
 from dataclasses import dataclass
+from typing import Any
 from uuid import UUID, uuid4
 
 import pytest
 from httpx import AsyncClient
-from sqlmodel import delete
-
-from app.db.models import TABLES, UserRole
-from app.db.operations import create_user
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import col, delete
+
+from app.db.models import DBUser, LoginSession, UserRole
+from app.db.operations import (
+    add_problems,
+    create_problemset,
+    delete_problemset,
+    login,
+)
+from app.db.utils import get_session
+from app.schemas.request import PROBLEM_SUBMIT_LIST_ADAPTER, ProblemSubmit
 from app.schemas.response import ProblemSetCreateStatus
 from app.typ import SessionGetterType
+from app.utils.security import hash
 
 
 @dataclass
@@ -21,106 +32,183 @@ class PreparedTestData:
 
 PASSWORD_FOR_TEST = "0d000721"
 PROBLEMSET_NAME_FOR_TEST = "Generic Problemset"
+FAKE_UUID = "12345678-1234-1234-1234-123456789012"
 
 
-@pytest.fixture(scope="function")
-async def setup_test_data(
-    test_session_getter: SessionGetterType,
+@pytest.fixture(scope="session")
+async def seeded_users(
+    test_engine: AsyncEngine,
 ) -> AsyncGenerator[PreparedTestData, None]:
-    """为每个测试准备数据"""
-    async with test_session_getter() as session:
-        # 清理现有数据
-        for table in TABLES:
-            await session.exec(delete(table))  # type: ignore
+    """整个测试会话只创建一次用户, 各测试中的改动随外层事务回滚, 不会影响它们"""
+    # 三个用户的 argon2 哈希互不依赖, 并发算完再在同一个事务里写入
+    # 共享的内存库连接上不能同时开多个事务, 所以不直接并发 create_user
+    password_hashes = await asyncio.gather(*(hash(PASSWORD_FOR_TEST) for _ in range(3)))
+    users = [
+        DBUser(
+            username=username,
+            email=email,
+            nickname=nickname,
+            password_hash=password_hash,
+            role=role,
+        )
+        for (username, email, nickname, role), password_hash in zip(
+            [
+                ("commonuser", "common@example.com", "普通用户", UserRole.USER),
+                ("admin", "admin@example.com", "权限狗", UserRole.ADMIN),
+                ("superuser", "su@example.com", "萝莉超管卡瓦", UserRole.SU),
+            ],
+            password_hashes,
+        )
+    ]
+    common_user_id, admin_id, su_id = (user.id for user in users)
+    async with get_session(test_engine) as session:
+        session.add_all(users)
         await session.commit()
 
-        # 创建测试用户
-        common_user_id = await create_user(
-            session,
-            "commonuser",
-            email="common@example.com",
-            nickname="普通用户",
-            password=PASSWORD_FOR_TEST,
-            role=UserRole.USER,
-        )
-        admin_id = await create_user(
-            session,
-            "admin",
-            email="admin@example.com",
-            nickname="权限狗",
-            password=PASSWORD_FOR_TEST,
-            role=UserRole.ADMIN,
-        )
-        su_id = await create_user(
-            session,
-            "superuser",
-            email="su@example.com",
-            nickname="萝莉超管卡瓦",
-            password=PASSWORD_FOR_TEST,
-            role=UserRole.SU,
-        )
-
     yield PreparedTestData(
         common_user_id,
         admin_id,
         su_id,
     )
 
-
-@pytest.fixture
-async def cu_auth_headers(
-    setup_test_data: PreparedTestData, test_client: AsyncClient
-) -> dict[str, str]:
-    resp = await test_client.post(
-        "/api/v1/session/login",
-        json={"user_id": str(setup_test_data.cuid), "password": PASSWORD_FOR_TEST},
-    )
-    result = resp.json()
-    assert resp.status_code == 200, result
-    return {"Authorization": f"Bearer {result['access_token']}"}
+    async with get_session(test_engine) as session:
+        await session.exec(
+            delete(DBUser).where(col(DBUser.id).in_([common_user_id, admin_id, su_id]))  # type: ignore
+        )
+        await session.commit()
 
 
-@pytest.fixture
-async def su_auth_headers(
-    setup_test_data: PreparedTestData, test_client: AsyncClient
-) -> dict[str, str]:
-    resp = await test_client.post(
-        "/api/v1/session/login",
-        json={"user_id": str(setup_test_data.suid), "password": PASSWORD_FOR_TEST},
-    )
-    result = resp.json()
-    assert resp.status_code == 200, result
-    return {"Authorization": f"Bearer {result['access_token']}"}
+AuthHeaders = dict[UserRole, dict[str, str]]
+
+
+@pytest.fixture(scope="session")
+async def auth_headers(
+    test_engine: AsyncEngine, seeded_users: PreparedTestData
+) -> AsyncGenerator[AuthHeaders, None]:
+    """三种角色各登录一次, 令牌在整个测试会话内复用
+
+    登录会话在外层事务之外提交, 测试里的登出/刷新会随回滚撤销, 不影响后续测试
+    """
+    user_ids = {
+        UserRole.USER: seeded_users.cuid,
+        UserRole.ADMIN: seeded_users.auid,
+        UserRole.SU: seeded_users.suid,
+    }
+    headers: AuthHeaders = {}
+    # 依次登录而不并发: 内存库只有一条共享连接, 并发的登录事务会互相冲突;
+    # 夹具是会话级的, 整轮测试只登录这三次
+    async with get_session(test_engine) as session:
+        for role, uid in user_ids.items():
+            tokens = await login(session, user_id=uid, password=PASSWORD_FOR_TEST)
+            assert tokens is not None
+            headers[role] = {"Authorization": f"Bearer {tokens[0]}"}
+
+    yield headers
+
+    async with get_session(test_engine) as session:
+        await session.exec(
+            delete(LoginSession).where(
+                col(LoginSession.user_id).in_(list(user_ids.values()))  # type: ignore
+            )
+        )
+        await session.commit()
 
 
 @pytest.fixture
-async def admin_auth_headers(
-    setup_test_data: PreparedTestData, test_client: AsyncClient
+async def fresh_auth_headers(
+    seeded_users: PreparedTestData, test_client: AsyncClient
 ) -> dict[str, str]:
+    """普通用户现场登录, 给会让令牌失效的测试使用"""
     resp = await test_client.post(
         "/api/v1/session/login",
-        json={"user_id": str(setup_test_data.auid), "password": PASSWORD_FOR_TEST},
+        json={"user_id": str(seeded_users.cuid), "password": PASSWORD_FOR_TEST},
     )
     result = resp.json()
     assert resp.status_code == 200, result
     return {"Authorization": f"Bearer {result['access_token']}"}
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 async def test_problemset(
-    test_client: AsyncClient,
-    admin_auth_headers: dict[str, str],
-) -> UUID:
-    # 虽然有点不正式但是这里隐式包含了创建问题集的测试
-    # 所以后面大概就不用写了 (x)
-    resp = await test_client.post(
-        "/api/v1/problem/create_set",
-        headers=admin_auth_headers,
-        json={"name": PROBLEMSET_NAME_FOR_TEST},
-    )
-    result = resp.json()
-    assert resp.status_code == 200, result
-    return UUID(result["id"])
+    test_engine: AsyncEngine,
+) -> AsyncGenerator[UUID, None]:
+    """整个模块共用一个题目集, 各测试往里加的题目随外层事务回滚"""
+    async with get_session(test_engine) as session:
+        problemset_id, _ = await create_problemset(session, PROBLEMSET_NAME_FOR_TEST)
+
+    yield problemset_id
+
+    async with get_session(test_engine) as session:
+        await delete_problemset(session, problemset_id)
+
+
+# 预置题目在导入时校验一次, 各测试直接复用
+QUERY_PROBLEMS = PROBLEM_SUBMIT_LIST_ADAPTER.validate_python(
+    [
+        {
+            "content": "Python编程语言的特点",
+            "type": "single_select",
+            "options": [
+                {"content": "简单易学", "is_correct": True, "order": 0},
+                {"content": "编译执行", "is_correct": False, "order": 1},
+            ],
+        },
+        {
+            "content": "Java是一种编程语言",
+            "type": "single_select",
+            "options": [
+                {"content": "是的", "is_correct": True, "order": 0},
+                {"content": "不是", "is_correct": False, "order": 1},
+            ],
+        },
+    ]
+)
+
+
+SAMPLE_PROBLEMS = PROBLEM_SUBMIT_LIST_ADAPTER.validate_python(
+    [
+        {
+            "content": f"抽样测试题目{i}",
+            "type": "single_select",
+            "options": [
+                {"content": f"答案{i}", "is_correct": True, "order": 0},
+            ],
+        }
+        for i in range(10)
+    ]
+)
+
+
+DELETE_PROBLEMS = PROBLEM_SUBMIT_LIST_ADAPTER.validate_python(
+    [
+        {
+            "content": "待删除题目1",
+            "type": "single_select",
+            "options": [
+                {"content": "答案1", "is_correct": True, "order": 0},
+            ],
+        },
+        {
+            "content": "待删除题目2",
+            "type": "single_select",
+            "options": [
+                {"content": "答案2", "is_correct": True, "order": 0},
+            ],
+        },
+    ]
+)
+
+
+async def seed_problems(
+    session_getter: SessionGetterType,
+    problemset_id: UUID,
+    problems: list[ProblemSubmit],
+) -> list[UUID]:
+    """绕过 HTTP 直接写库, 给不测试添加接口本身的用例准备题目"""
+    async with session_getter() as session:
+        ids = await add_problems(session, problemset_id, *problems)
+    assert ids is not None
+    return ids
 
 
 class TestProblemAPIs:
@@ -128,25 +216,96 @@ class TestProblemAPIs:
         self,
         test_client: AsyncClient,
         test_problemset: UUID,
-        cu_auth_headers: dict[str, str],
+        auth_headers: AuthHeaders,
     ) -> None:
         resp = await test_client.get(
-            "/api/v1/problem/list_set", headers=cu_auth_headers
+            "/api/v1/problem/list_set", headers=auth_headers[UserRole.USER]
         )
         result = resp.json()
         assert resp.status_code == 200, result
         assert len(result) == 1
         assert UUID(result[0]["id"]) == test_problemset
 
+    async def test_list_problemset_etag(
+        self,
+        test_client: AsyncClient,
+        test_problemset: UUID,
+        auth_headers: AuthHeaders,
+    ) -> None:
+        """测试题目集列表的条件请求"""
+        resp = await test_client.get(
+            "/api/v1/problem/list_set", headers=auth_headers[UserRole.USER]
+        )
+        assert resp.status_code == 200, resp.json()
+        etag = resp.headers["etag"]
+
+        # 列表未变化时返回 304
+        resp = await test_client.get(
+            "/api/v1/problem/list_set",
+            headers={**auth_headers[UserRole.USER], "If-None-Match": etag},
+        )
+        assert resp.status_code == 304
+        assert resp.headers["etag"] == etag
+        for if_none_match in ("*", etag.removeprefix("W/"), f'"other", {etag}'):
+            resp = await test_client.get(
+                "/api/v1/problem/list_set",
+                headers={**auth_headers[UserRole.USER], "If-None-Match": if_none_match},
+            )
+            assert resp.status_code == 304, if_none_match
+
+        # 新增题目后列表变化, 重新返回完整内容
+        resp = await test_client.post(
+            "/api/v1/problem/add",
+            headers=auth_headers[UserRole.ADMIN],
+            json={
+                "problemset_id": str(test_problemset),
+                "problems": [
+                    {
+                        "content": "ETag测试题目",
+                        "type": "single_select",
+                        "options": [
+                            {"content": "答案", "is_correct": True, "order": 0},
+                        ],
+                    }
+                ],
+            },
+        )
+        assert resp.status_code == 200, resp.json()
+        resp = await test_client.get(
+            "/api/v1/problem/list_set",
+            headers={**auth_headers[UserRole.USER], "If-None-Match": etag},
+        )
+        result = resp.json()
+        assert resp.status_code == 200, result
+        assert resp.headers["etag"] != etag
+        assert result[0]["count"] == 1
+
+    async def test_create_problemset(
+        self,
+        test_client: AsyncClient,
+        auth_headers: AuthHeaders,
+    ) -> None:
+        resp = await test_client.post(
+            "/api/v1/problem/create_set",
+            headers=auth_headers[UserRole.ADMIN],
+            json={"name": "Another Problemset"},
+        )
+        result = resp.json()
+        assert resp.status_code == 200, result
+        assert (
+            ProblemSetCreateStatus(result["status"]) == ProblemSetCreateStatus.SUCCESS
+        )
+        UUID(result["id"])
+
     async def test_create_duplicated_problemset(
         self,
         test_client: AsyncClient,
         test_problemset: UUID,
-        admin_auth_headers: dict[str, str],
+        auth_headers: AuthHeaders,
     ) -> None:
         resp = await test_client.post(
             "/api/v1/problem/create_set",
-            headers=admin_auth_headers,
+            headers=auth_headers[UserRole.ADMIN],
             json={"name": PROBLEMSET_NAME_FOR_TEST},
         )
         result = resp.json()
@@ -161,7 +320,7 @@ class TestProblemAPIs:
         self,
         test_client: AsyncClient,
         test_problemset: UUID,
-        admin_auth_headers: dict[str, str],
+        auth_headers: AuthHeaders,
     ) -> None:
         """测试添加题目"""
         problem_data = [
@@ -188,7 +347,7 @@ class TestProblemAPIs:
 
         resp = await test_client.post(
             "/api/v1/problem/add",
-            headers=admin_auth_headers,
+            headers=auth_headers[UserRole.ADMIN],
             json={
                 "problemset_id": str(test_problemset),
                 "problems": problem_data,
@@ -199,253 +358,120 @@ class TestProblemAPIs:
         assert len(result) == 2
         assert all(isinstance(UUID(pid), UUID) for pid in result)
 
-    async def test_add_problems_to_nonexistent_set(
+    @pytest.mark.parametrize(
+        "path,payload,role",
+        [
+            (
+                "/api/v1/problem/add",
+                {
+                    "problemset_id": FAKE_UUID,
+                    "problems": [
+                        {
+                            "content": "测试问题",
+                            "type": "single_select",
+                            "options": [
+                                {"content": "选项A", "is_correct": True, "order": 0},
+                            ],
+                        }
+                    ],
+                },
+                UserRole.ADMIN,
+            ),
+            (
+                "/api/v1/stat/report",
+                {"problem_id": FAKE_UUID, "correct": True},
+                UserRole.USER,
+            ),
+        ],
+        ids=["add_to_nonexistent_set", "report_nonexistent_problem"],
+    )
+    async def test_not_found(
         self,
         test_client: AsyncClient,
-        admin_auth_headers: dict[str, str],
+        auth_headers: AuthHeaders,
+        path: str,
+        payload: dict[str, Any],
+        role: UserRole,
     ) -> None:
-        """测试向不存在的问题集添加题目"""
-        fake_problemset_id = "12345678-1234-1234-1234-123456789012"
-        problem_data = [
-            {
-                "content": "测试问题",
-                "type": "single_select",
-                "options": [
-                    {"content": "选项A", "is_correct": True, "order": 0},
-                ],
-            }
-        ]
-
-        resp = await test_client.post(
-            "/api/v1/problem/add",
-            headers=admin_auth_headers,
-            json={
-                "problemset_id": fake_problemset_id,
-                "problems": problem_data,
-            },
-        )
-        assert resp.status_code == 404
+        """测试引用不存在的题目集/题目时返回 404"""
+        resp = await test_client.post(path, headers=auth_headers[role], json=payload)
+        assert resp.status_code == 404, resp.json()
 
-    async def test_search_problems(
+    async def test_query_problems(
         self,
         test_client: AsyncClient,
         test_problemset: UUID,
-        cu_auth_headers: dict[str, str],
-        admin_auth_headers: dict[str, str],
+        auth_headers: AuthHeaders,
+        test_session_getter: SessionGetterType,
     ) -> None:
-        """测试搜索题目"""
+        """测试搜索/获取/计数题目, 共用同一批题目"""
         # 先添加一些测试题目
-        problem_data = [
-            {
-                "content": "Python编程语言的特点",
-                "type": "single_select",
-                "options": [
-                    {"content": "简单易学", "is_correct": True, "order": 0},
-                    {"content": "编译执行", "is_correct": False, "order": 1},
-                ],
-            },
-            {
-                "content": "Java是一种编程语言",
-                "type": "single_select",
-                "options": [
-                    {"content": "是的", "is_correct": True, "order": 0},
-                    {"content": "不是", "is_correct": False, "order": 1},
-                ],
-            },
+        await seed_problems(test_session_getter, test_problemset, QUERY_PROBLEMS)
+
+        by_set: dict[str, str | int] = {"problemset_id": str(test_problemset)}
+        queries: list[tuple[str, dict[str, str | int]]] = [
+            ("search", {"kw": "Python"}),
+            ("search", {"kw": "编程语言"}),
+            ("search", by_set),
+            ("search", {"page": 1, "page_size": 1}),
+            ("get", {}),
+            ("get", by_set),
+            ("count", {}),
+            ("count", by_set),
         ]
-
-        await test_client.post(
-            "/api/v1/problem/add",
-            headers=admin_auth_headers,
-            json={
-                "problemset_id": str(test_problemset),
-                "problems": problem_data,
-            },
-        )
-
-        # 测试搜索包含"Python"的题目
-        resp = await test_client.get(
-            "/api/v1/problem/search",
-            headers=cu_auth_headers,
-            params={"kw": "Python"},
-        )
-        result = resp.json()
-        assert resp.status_code == 200, result
-        assert len(result) == 1
-        assert "Python" in result[0]["content"]
-
-        # 测试搜索包含"编程语言"的题目
-        resp = await test_client.get(
-            "/api/v1/problem/search",
-            headers=cu_auth_headers,
-            params={"kw": "编程语言"},
-        )
-        result = resp.json()
-        assert resp.status_code == 200, result
-        assert len(result) == 2  # 两个问题都包含"编程语言"
-
-        # 测试按问题集搜索
-        resp = await test_client.get(
-            "/api/v1/problem/search",
-            headers=cu_auth_headers,
-            params={"problemset_id": str(test_problemset)},
-        )
-        result = resp.json()
-        assert resp.status_code == 200, result
-        assert len(result) == 2
-
-        # 测试分页搜索
-        resp = await test_client.get(
-            "/api/v1/problem/search",
-            headers=cu_auth_headers,
-            params={"page": 1, "page_size": 1},
-        )
-        result = resp.json()
-        assert resp.status_code == 200, result
-        assert len(result) == 1
-
-    async def test_get_problems(
-        self,
-        test_client: AsyncClient,
-        test_problemset: UUID,
-        cu_auth_headers: dict[str, str],
-        admin_auth_headers: dict[str, str],
-    ) -> None:
-        """测试获取题目（无关键词搜索）"""
-        # 先添加测试题目
-        problem_data = [
-            {
-                "content": "测试题目1",
-                "type": "single_select",
-                "options": [
-                    {"content": "答案1", "is_correct": True, "order": 0},
-                ],
-            },
-            {
-                "content": "测试题目2",
-                "type": "single_select",
-                "options": [
-                    {"content": "答案2", "is_correct": True, "order": 0},
-                ],
-            },
-        ]
-
-        await test_client.post(
-            "/api/v1/problem/add",
-            headers=admin_auth_headers,
-            json={
-                "problemset_id": str(test_problemset),
-                "problems": problem_data,
-            },
-        )
-
-        # 测试获取所有题目
-        resp = await test_client.get(
-            "/api/v1/problem/get",
-            headers=cu_auth_headers,
-        )
-        result = resp.json()
-        assert resp.status_code == 200, result
-        assert len(result) >= 2
-
-        # 测试按问题集获取题目
-        resp = await test_client.get(
-            "/api/v1/problem/get",
-            headers=cu_auth_headers,
-            params={"problemset_id": str(test_problemset)},
-        )
-        result = resp.json()
-        assert resp.status_code == 200, result
-        assert len(result) == 2
-
-    async def test_get_problem_count(
-        self,
-        test_client: AsyncClient,
-        test_problemset: UUID,
-        cu_auth_headers: dict[str, str],
-        admin_auth_headers: dict[str, str],
-    ) -> None:
-        """测试获取题目数量"""
-        # 先添加测试题目
-        problem_data = [
-            {
-                "content": "计数测试题目1",
-                "type": "single_select",
-                "options": [
-                    {"content": "答案1", "is_correct": True, "order": 0},
-                ],
-            },
-            {
-                "content": "计数测试题目2",
-                "type": "single_select",
-                "options": [
-                    {"content": "答案2", "is_correct": True, "order": 0},
-                ],
-            },
+        # 依次发出: 测试会话按锁排队, 并发发出也只会逐个执行, 这里只验证各查询的结果
+        resps = [
+            await test_client.get(
+                f"/api/v1/problem/{endpoint}",
+                headers=auth_headers[UserRole.USER],
+                params=params,
+            )
+            for endpoint, params in queries
         ]
-
-        await test_client.post(
-            "/api/v1/problem/add",
-            headers=admin_auth_headers,
-            json={
-                "problemset_id": str(test_problemset),
-                "problems": problem_data,
-            },
-        )
-
-        # 测试获取总题目数
-        resp = await test_client.get(
-            "/api/v1/problem/count",
-            headers=cu_auth_headers,
-        )
-        result = resp.json()
-        assert resp.status_code == 200, result
-        assert result >= 2
-
-        # 测试获取特定问题集的题目数
-        resp = await test_client.get(
-            "/api/v1/problem/count",
-            headers=cu_auth_headers,
-            params={"problemset_id": str(test_problemset)},
-        )
-        result = resp.json()
-        assert resp.status_code == 200, result
-        assert result == 2
+        for resp in resps:
+            assert resp.status_code == 200, resp.json()
+        (
+            python_hits,
+            language_hits,
+            set_hits,
+            page_hits,
+            all_problems,
+            set_problems,
+            total_count,
+            set_count,
+        ) = (resp.json() for resp in resps)
+
+        # 搜索包含"Python"的题目
+        assert len(python_hits) == 1
+        assert "Python" in python_hits[0]["content"]
+        # 两个问题都包含"编程语言"
+        assert len(language_hits) == 2
+        # 按问题集搜索
+        assert len(set_hits) == 2
+        # 分页搜索
+        assert len(page_hits) == 1
+        # 获取所有题目 / 按问题集获取题目
+        assert len(all_problems) >= 2
+        assert len(set_problems) == 2
+        # 总题目数 / 特定问题集的题目数
+        assert total_count >= 2
+        assert set_count == 2
 
     async def test_random_sample_problems(
         self,
         test_client: AsyncClient,
         test_problemset: UUID,
-        cu_auth_headers: dict[str, str],
-        admin_auth_headers: dict[str, str],
+        auth_headers: AuthHeaders,
+        test_session_getter: SessionGetterType,
     ) -> None:
         """测试随机抽样题目"""
         # 先添加多个测试题目
-        problem_data = []
-        for i in range(10):
-            problem_data.append(
-                {
-                    "content": f"抽样测试题目{i}",
-                    "type": "single_select",
-                    "options": [
-                        {"content": f"答案{i}", "is_correct": True, "order": 0},
-                    ],
-                }
-            )
-
-        await test_client.post(
-            "/api/v1/problem/add",
-            headers=admin_auth_headers,
-            json={
-                "problemset_id": str(test_problemset),
-                "problems": problem_data,
-            },
-        )
+        await seed_problems(test_session_getter, test_problemset, SAMPLE_PROBLEMS)
 
         # 测试抽样5个题目
         resp = await test_client.get(
             "/api/v1/problem/random",
-            headers=cu_auth_headers,
+            headers=auth_headers[UserRole.USER],
             params={
                 "problemset_id": str(test_problemset),
                 "n": 5,
@@ -466,53 +492,22 @@ class TestProblemAPIs:
         self,
         test_client: AsyncClient,
         test_problemset: UUID,
-        admin_auth_headers: dict[str, str],
-        cu_auth_headers: dict[str, str],
+        auth_headers: AuthHeaders,
+        test_session_getter: SessionGetterType,
     ) -> None:
         """测试删除题目"""
         # 先添加测试题目
-        problem_data = [
-            {
-                "content": "待删除题目1",
-                "type": "single_select",
-                "options": [
-                    {"content": "答案1", "is_correct": True, "order": 0},
-                ],
-            },
-            {
-                "content": "待删除题目2",
-                "type": "single_select",
-                "options": [
-                    {"content": "答案2", "is_correct": True, "order": 0},
-                ],
-            },
-        ]
-
-        resp = await test_client.post(
-            "/api/v1/problem/add",
-            headers=admin_auth_headers,
-            json={
-                "problemset_id": str(test_problemset),
-                "problems": problem_data,
-            },
+        problem_ids = await seed_problems(
+            test_session_getter, test_problemset, DELETE_PROBLEMS
         )
-        problem_ids = resp.json()
-        assert resp.status_code == 200
 
-        # 验证题目存在
-        resp = await test_client.get(
-            "/api/v1/problem/search",
-            headers=cu_auth_headers,
-            params={"kw": "待删除"},
-        )
-        result = resp.json()
-        assert len(result) == 2
+        assert len(problem_ids) == 2
 
         # 删除第一个题目
         resp = await test_client.post(
             "/api/v1/problem/delete",
-            headers=admin_auth_headers,
-            json=[problem_ids[0]],
+            headers=auth_headers[UserRole.ADMIN],
+            json=[str(problem_ids[0])],
         )
         assert resp.status_code == 200
         assert resp.json() == "ok"
@@ -520,7 +515,7 @@ class TestProblemAPIs:
         # 验证题目已被删除
         resp = await test_client.get(
             "/api/v1/problem/search",
-            headers=cu_auth_headers,
+            headers=auth_headers[UserRole.USER],
             params={"kw": "待删除"},
         )
         result = resp.json()
@@ -531,7 +526,7 @@ class TestProblemAPIs:
         self,
         test_client: AsyncClient,
         test_problemset: UUID,
-        cu_auth_headers: dict[str, str],
+        auth_headers: AuthHeaders,
     ) -> None:
         """测试普通用户无权限添加题目"""
         problem_data = [
@@ -546,7 +541,7 @@ class TestProblemAPIs:
 
         resp = await test_client.post(
             "/api/v1/problem/add",
-            headers=cu_auth_headers,
+            headers=auth_headers[UserRole.USER],
             json={
                 "problemset_id": str(test_problemset),
                 "problems": problem_data,
@@ -557,14 +552,13 @@ class TestProblemAPIs:
     async def test_delete_problems_permission_denied(
         self,
         test_client: AsyncClient,
-        cu_auth_headers: dict[str, str],
+        auth_headers: AuthHeaders,
     ) -> None:
         """测试普通用户无权限删除题目"""
-        fake_problem_id = "12345678-1234-1234-1234-123456789012"
         resp = await test_client.post(
             "/api/v1/problem/delete",
-            headers=cu_auth_headers,
-            json=[fake_problem_id],
+            headers=auth_headers[UserRole.USER],
+            json=[FAKE_UUID],
         )
         assert resp.status_code == 403
 
@@ -593,55 +587,28 @@ class TestUserAPIs:
         assert "user_id" in result
         assert isinstance(UUID(result["user_id"]), UUID)
 
-    async def test_user_register_duplicate_username(
-        self,
-        test_client: AsyncClient,
-        setup_test_data: PreparedTestData,
-    ) -> None:
-        """测试重复用户名注册"""
-        user_data = {
-            "username": "commonuser",  # 已存在的用户名
-            "email": "different@example.com",
-            "nickname": "不同昵称",
-            "password": "password123",
-        }
-
-        resp = await test_client.post(
-            "/api/v1/user/register",
-            json=user_data,
-        )
-        assert resp.status_code == 400
-
-    async def test_user_register_duplicate_email(
-        self,
-        test_client: AsyncClient,
-        setup_test_data: PreparedTestData,
-    ) -> None:
-        """测试重复邮箱注册"""
-        user_data = {
-            "username": "differentuser",
-            "email": "common@example.com",  # 已存在的邮箱
-            "nickname": "不同昵称",
-            "password": "password123",
-        }
-
-        resp = await test_client.post(
-            "/api/v1/user/register",
-            json=user_data,
-        )
-        assert resp.status_code == 400
-
-    async def test_user_register_duplicate_nickname(
+    @pytest.mark.parametrize(
+        "field,value",
+        [
+            ("username", "commonuser"),
+            ("email", "common@example.com"),
+            ("nickname", "普通用户"),
+        ],
+    )
+    async def test_user_register_duplicate(
         self,
         test_client: AsyncClient,
-        setup_test_data: PreparedTestData,
+        seeded_users: PreparedTestData,
+        field: str,
+        value: str,
     ) -> None:
-        """测试重复昵称注册"""
+        """测试用户名/邮箱/昵称重复时注册失败"""
         user_data = {
             "username": "differentuser",
             "email": "different@example.com",
-            "nickname": "普通用户",  # 已存在的昵称
+            "nickname": "不同昵称",
             "password": "password123",
+            field: value,  # 已存在的值
         }
 
         resp = await test_client.post(
@@ -650,103 +617,45 @@ class TestUserAPIs:
         )
         assert resp.status_code == 400
 
-    async def test_check_field_availability(
+    @pytest.mark.parametrize(
+        "field,value,expected",
+        [
+            ("username", "availablename", "ok"),
+            ("email", "available@example.com", "ok"),
+            ("nickname", "可用昵称", "ok"),
+            ("username", "commonuser", "conflict"),
+            ("email", "common@example.com", "conflict"),
+            ("nickname", "普通用户", "conflict"),
+            ("email", "invalid-email", "invalid"),
+            ("username", "ab", "invalid"),  # 太短
+            ("nickname", "a", "invalid"),  # 太短
+        ],
+    )
+    async def test_check_field(
         self,
         test_client: AsyncClient,
+        seeded_users: PreparedTestData,
+        field: str,
+        value: str,
+        expected: str,
     ) -> None:
         """测试检查字段可用性"""
-        # 测试可用用户名
         resp = await test_client.get(
             "/api/v1/user/check_field",
-            params={"field": "username", "value": "availablename"},
+            params={"field": field, "value": value},
         )
         assert resp.status_code == 200
-        assert resp.json() == "ok"
-
-        # 测试可用邮箱
-        resp = await test_client.get(
-            "/api/v1/user/check_field",
-            params={"field": "email", "value": "available@example.com"},
-        )
-        assert resp.status_code == 200
-        assert resp.json() == "ok"
-
-        # 测试可用昵称
-        resp = await test_client.get(
-            "/api/v1/user/check_field",
-            params={"field": "nickname", "value": "可用昵称"},
-        )
-        assert resp.status_code == 200
-        assert resp.json() == "ok"
-
-    async def test_check_field_conflict(
-        self,
-        test_client: AsyncClient,
-        setup_test_data: PreparedTestData,
-    ) -> None:
-        """测试检查字段冲突"""
-        # 测试冲突的用户名
-        resp = await test_client.get(
-            "/api/v1/user/check_field",
-            params={"field": "username", "value": "commonuser"},
-        )
-        assert resp.status_code == 200
-        assert resp.json() == "conflict"
-
-        # 测试冲突的邮箱
-        resp = await test_client.get(
-            "/api/v1/user/check_field",
-            params={"field": "email", "value": "common@example.com"},
-        )
-        assert resp.status_code == 200
-        assert resp.json() == "conflict"
-
-        # 测试冲突的昵称
-        resp = await test_client.get(
-            "/api/v1/user/check_field",
-            params={"field": "nickname", "value": "普通用户"},
-        )
-        assert resp.status_code == 200
-        assert resp.json() == "conflict"
-
-    async def test_check_field_invalid(
-        self,
-        test_client: AsyncClient,
-    ) -> None:
-        """测试检查无效字段"""
-        # 测试无效邮箱格式
-        resp = await test_client.get(
-            "/api/v1/user/check_field",
-            params={"field": "email", "value": "invalid-email"},
-        )
-        assert resp.status_code == 200
-        assert resp.json() == "invalid"
-
-        # 测试无效用户名格式
-        resp = await test_client.get(
-            "/api/v1/user/check_field",
-            params={"field": "username", "value": "ab"},  # 太短
-        )
-        assert resp.status_code == 200
-        assert resp.json() == "invalid"
-
-        # 测试无效昵称格式
-        resp = await test_client.get(
-            "/api/v1/user/check_field",
-            params={"field": "nickname", "value": "a"},  # 太短
-        )
-        assert resp.status_code == 200
-        assert resp.json() == "invalid"
+        assert resp.json() == expected
 
     async def test_get_my_info(
         self,
         test_client: AsyncClient,
-        cu_auth_headers: dict[str, str],
+        auth_headers: AuthHeaders,
     ) -> None:
         """测试获取当前用户信息"""
         resp = await test_client.get(
             "/api/v1/user/me",
-            headers=cu_auth_headers,
+            headers=auth_headers[UserRole.USER],
         )
         result = resp.json()
         assert resp.status_code == 200, result
@@ -760,14 +669,14 @@ class TestUserAPIs:
     async def test_get_user_info(
         self,
         test_client: AsyncClient,
-        setup_test_data: PreparedTestData,
-        cu_auth_headers: dict[str, str],
+        seeded_users: PreparedTestData,
+        auth_headers: AuthHeaders,
     ) -> None:
         """测试获取其他用户信息"""
         resp = await test_client.get(
             "/api/v1/user/info",
-            headers=cu_auth_headers,
-            params={"user_id": str(setup_test_data.auid)},  # 管理员用户
+            headers=auth_headers[UserRole.USER],
+            params={"user_id": str(seeded_users.auid)},  # 管理员用户
         )
         result = resp.json()
         assert resp.status_code == 200, result
@@ -782,72 +691,41 @@ class TestUserAPIs:
 class TestSessionAPIs:
     """会话API测试"""
 
-    async def test_login_by_user_id(
+    @pytest.mark.parametrize("identifier", ["user_id", "username", "email"])
+    async def test_login(
         self,
         test_client: AsyncClient,
-        setup_test_data: PreparedTestData,
+        seeded_users: PreparedTestData,
+        identifier: str,
     ) -> None:
-        """测试通过用户ID登录"""
+        """测试通过用户ID/用户名/邮箱登录"""
+        identifiers = {
+            "user_id": str(seeded_users.cuid),
+            "username": "commonuser",
+            "email": "common@example.com",
+        }
         resp = await test_client.post(
             "/api/v1/session/login",
             json={
-                "user_id": str(setup_test_data.cuid),
+                identifier: identifiers[identifier],
                 "password": PASSWORD_FOR_TEST,
             },
         )
         result = resp.json()
         assert resp.status_code == 200, result
-        assert "access_token" in result
-        assert "refresh_token" in result
         assert isinstance(UUID(result["access_token"]), UUID)
         assert isinstance(UUID(result["refresh_token"]), UUID)
 
-    async def test_login_by_username(
-        self,
-        test_client: AsyncClient,
-        setup_test_data: PreparedTestData,
-    ) -> None:
-        """测试通过用户名登录"""
-        resp = await test_client.post(
-            "/api/v1/session/login",
-            json={
-                "username": "commonuser",
-                "password": PASSWORD_FOR_TEST,
-            },
-        )
-        result = resp.json()
-        assert resp.status_code == 200, result
-        assert "access_token" in result
-        assert "refresh_token" in result
-
-    async def test_login_by_email(
-        self,
-        test_client: AsyncClient,
-        setup_test_data: PreparedTestData,
-    ) -> None:
-        """测试通过邮箱登录"""
-        resp = await test_client.post(
-            "/api/v1/session/login",
-            json={
-                "email": "common@example.com",
-                "password": PASSWORD_FOR_TEST,
-            },
-        )
-        result = resp.json()
-        assert resp.status_code == 200, result
-        assert "access_token" in result
-        assert "refresh_token" in result
-
     async def test_login_with_wrong_password(
         self,
         test_client: AsyncClient,
-        setup_test_data: PreparedTestData,
+        seeded_users: PreparedTestData,
     ) -> None:
         """测试使用错误密码登录"""
         resp = await test_client.post(
             "/api/v1/session/login",
             json={
-                "user_id": str(setup_test_data.cuid),
+                "user_id": str(seeded_users.cuid),
                 "password": "wrongpassword",
             },
         )
@@ -861,7 +739,7 @@ class TestSessionAPIs:
         resp = await test_client.post(
             "/api/v1/session/login",
             json={
-                "user_id": "12345678-1234-1234-1234-123456789012",
+                "user_id": FAKE_UUID,
                 "password": "anypassword",
             },
         )
@@ -870,12 +748,12 @@ class TestSessionAPIs:
     async def test_logout(
         self,
         test_client: AsyncClient,
-        cu_auth_headers: dict[str, str],
+        fresh_auth_headers: dict[str, str],
     ) -> None:
         """测试登出"""
         resp = await test_client.post(
             "/api/v1/session/logout",
-            headers=cu_auth_headers,
+            headers=fresh_auth_headers,
         )
         assert resp.status_code == 200
         assert resp.json() == "ok"
@@ -883,14 +761,14 @@ class TestSessionAPIs:
     async def test_refresh_token(
         self,
         test_client: AsyncClient,
-        setup_test_data: PreparedTestData,
+        seeded_users: PreparedTestData,
     ) -> None:
         """测试刷新访问令牌"""
         # 先登录获取refresh_token
         login_resp = await test_client.post(
             "/api/v1/session/login",
             json={
-                "user_id": str(setup_test_data.cuid),
+                "user_id": str(seeded_users.cuid),
                 "password": PASSWORD_FOR_TEST,
             },
         )
@@ -914,13 +792,13 @@ class TestSessionAPIs:
     async def test_refresh_token_with_invalid_token(
         self,
         test_client: AsyncClient,
-        cu_auth_headers: dict[str, str],
+        fresh_auth_headers: dict[str, str],
     ) -> None:
         """测试使用无效的refresh_token"""
 
         resp = await test_client.post(
             "/api/v1/session/refresh",
-            headers=cu_auth_headers,
+            headers=fresh_auth_headers,
             json={"refresh_token": str(uuid4())},
         )
         assert resp.status_code == 401, resp.json()
@@ -941,3 +819,40 @@ class TestSessionAPIs:
         headers = {"Authorization": "Bearer invalid-token"}
         resp = await test_client.get("/api/v1/user/me", headers=headers)
         assert resp.status_code == 401, resp.json()
+
+
+class TestCORS:
+    """跨域配置测试"""
+
+    @pytest.mark.parametrize(
+        "origin,allowed",
+        [
+            ("http://localhost:5173", True),
+            ("https://127.0.0.1", True),
+            ("http://[::1]:3000", True),
+            ("http://0.0.0.0:8080", True),
+            ("http://example.com", False),
+            ("http://localhost.example.com", False),
+            ("ftp://localhost", False),
+            ("http://localhost:abc", False),
+            ("http://localhost/path", False),
+        ],
+    )
+    async def test_preflight_origin(
+        self,
+        test_client: AsyncClient,
+        origin: str,
+        allowed: bool,
+    ) -> None:
+        """测试开发环境来源的预检请求"""
+        resp = await test_client.options(
+            "/api/v1/user/me",
+            headers={
+                "Origin": origin,
+                "Access-Control-Request-Method": "GET",
+            },
+        )
+        assert (resp.status_code == 200) is allowed
+        assert (resp.headers.get("access-control-allow-origin") == origin) is allowed
+        if allowed:
+            assert resp.headers["access-control-max-age"] == "86400"
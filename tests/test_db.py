@@ -1,21 +1,27 @@
-import asyncio
+import csv
+import itertools
 import json
 import time
+import unicodedata
 from collections.abc import AsyncGenerator
-from uuid import UUID, uuid4
+from typing import Any
+from uuid import UUID
 
-import dotenv
 import pytest
+from sqlalchemy import event
 from sqlalchemy.exc import IntegrityError
-from sqlmodel import col, delete, select
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import col, func, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.db.models import (
-    TABLES,
+    DBAnswerRecord,
     DBOption,
     DBProblem,
+    DBProblemSet,
     DBUser,
     ProblemType,
+    SQLModel,
 )
 from app.db.operations import (
     ProblemSetCreateStatus,
@@ -28,31 +34,42 @@ from app.db.operations import (
     get_problem_count,
     list_problemset,
     query_problem,
+    query_problems,
     query_user,
     report_attempt,
+    report_attempts,
     sample,
     search_problem,
 )
-from app.schemas.request import OptionSubmit, ProblemSubmit
+from app.db.utils import auto_begin, get_session, new_engine
+from app.schemas.request import (
+    PROBLEM_SUBMIT_LIST_ADAPTER,
+    OptionSubmit,
+    ProblemSubmit,
+)
 from app.typ import SessionGetterType
 from app.utils.misc import utcnow
 
-dotenv.load_dotenv()
-
 DB_NAME = "test_dbopts"
 
+_fake_ids = itertools.count(0xDEADBEEF)
+
+
+def fake_uuid() -> UUID:
+    """确定性的、库里必然不存在的 id, 免去 uuid4 读 urandom"""
+    return UUID(int=next(_fake_ids))
+
 
-@pytest.fixture(scope="function")
+@pytest.fixture(scope="module")
 async def init_problemset_uuid(
-    test_session_getter: SessionGetterType,
+    test_engine: AsyncEngine,
 ) -> AsyncGenerator[UUID, None]:
-    async with test_session_getter() as session:
-        for table in TABLES:
-            await session.exec(delete(table))  # type: ignore
-        await session.flush()
+    """整个模块共用一个题目集, 各测试里的增删随外层事务回滚"""
+    async with get_session(test_engine) as session:
         id_, _ = await create_problemset(session, "test")
-        await session.commit()
     yield id_
+    async with get_session(test_engine) as session:
+        await delete_problemset(session, id_)
 
 
 async def _create_user_simple(session: AsyncSession, username: str) -> UUID:
@@ -95,61 +112,79 @@ async def test_add(
         assert options[0].content == "2034324"
 
 
-async def test_multiadd(
-    test_session_getter: SessionGetterType, init_problemset_uuid: UUID
-) -> None:
-    with open("data/example_data.csv", "r", encoding="utf-8", errors="replace") as fp:
-        sheet = fp.readlines()
-    problems: list[ProblemSubmit] = []
-    for idx, raw_problem in enumerate(sheet):
-        if idx == 0:
-            continue
-        _, type_, content, answ, _, _, _, _, a, b, c, d, _, _ = (
-            raw_problem.strip().split(",")
-        )
-        problems.append(
-            ProblemSubmit(
-                content=content,
-                type=(
-                    ProblemType.multi_select
-                    if type_ == "多选题"
-                    else ProblemType.single_select
-                ),
-                options=[
-                    OptionSubmit(
-                        content=opcontent,
-                        order=ord(order) - ord("A"),
-                        is_correct=order in answ,
-                    )
-                    for order, opcontent in zip("ABCD", filter(None, [a, b, c, d]))
-                ],
-            )
+def trusted_problem(
+    content: str,
+    *options: tuple[str, bool],
+    type: ProblemType = ProblemType.single_select,
+) -> ProblemSubmit:
+    """
+    构造测试题目, 选项按给出的 (内容, 是否正确) 顺序编号.
+    测试数据由测试自己生成或来自仓库内的示例文件, 是可信的, 故用 model_construct 跳过校验,
+    大批量构造时省下校验开销, 计时类测试也只反映入库本身
+    """
+    return ProblemSubmit.model_construct(
+        content=content,
+        type=type,
+        options=[
+            OptionSubmit.model_construct(content=c, order=i, is_correct=ok)
+            for i, (c, ok) in enumerate(options)
+        ],
+    )
+
+
+@pytest.fixture(scope="session")
+def example_problems() -> list[ProblemSubmit]:
+    """解析一次示例 CSV"""
+    with open(
+        "data/example_data.csv", "r", encoding="utf-8", errors="replace", newline=""
+    ) as fp:
+        rows = list(csv.reader(fp))[1:]
+    return [
+        trusted_problem(
+            content,
+            *(
+                (opcontent, order in answ)
+                for order, opcontent in zip("ABCD", (a, b, c, d))
+                if opcontent
+            ),
+            type=(
+                ProblemType.multi_select
+                if type_ == "多选题"
+                else ProblemType.single_select
+            ),
         )
+        for _, type_, content, answ, _, _, _, _, a, b, c, d, _, _ in rows
+    ]
+
+
+@pytest.fixture(scope="session")
+def example_problemsets() -> list[tuple[str, list[ProblemSubmit]]]:
     with open("data/example_data.json", "r", encoding="utf-8") as fp:
-        sheet_ = json.load(fp)
+        sheet = json.load(fp)
+    return [
+        (s["name"], PROBLEM_SUBMIT_LIST_ADAPTER.validate_python(s["problems"]))
+        for s in sheet
+    ]
+
+
+async def test_multiadd(
+    test_session_getter: SessionGetterType,
+    init_problemset_uuid: UUID,
+    example_problems: list[ProblemSubmit],
+    example_problemsets: list[tuple[str, list[ProblemSubmit]]],
+) -> None:
     additional = 0
-    start_time = time.time()
+    start_time = time.perf_counter()
     async with test_session_getter() as session:
-        for s in sheet_:
-            i, _ = await create_problemset(session, s["name"])
-            await add_problems(
-                session,
-                i,
-                *[
-                    ProblemSubmit(
-                        content=p["content"],
-                        type=p["type"],
-                        options=[OptionSubmit(**o) for o in p["options"]],
-                    )
-                    for p in s["problems"]
-                ],
-            )
-            additional += len(s["problems"])
-        await add_problems(session, init_problemset_uuid, *problems)
+        for name, problems in example_problemsets:
+            i, _ = await create_problemset(session, name)
+            await add_problems(session, i, *problems)
+            additional += len(problems)
+        await add_problems(session, init_problemset_uuid, *example_problems)
         print(
-            f"添加 {len(problems) + additional} 个问题耗时: {time.time() - start_time:.3f}秒"
+            f"添加 {len(example_problems) + additional} 个问题耗时: {time.perf_counter() - start_time:.3f}秒"
         )
-        assert (await get_problem_count(session)) == len(problems) + additional
+        assert (await get_problem_count(session)) == len(example_problems) + additional
 
 
 async def test_query_problem(
@@ -187,7 +222,7 @@ async def test_query_problem(
 
     async with test_session_getter() as session:
         # 测试查询不存在的问题
-        non_existent_id = uuid4()
+        non_existent_id = fake_uuid()
         non_existent_problem = await query_problem(session, non_existent_id)
         assert non_existent_problem is None
 
@@ -232,19 +267,121 @@ async def test_search_problem(
         # 搜索包含"Python"的问题
         results = await search_problem(session, "Python")
         assert len(results) == 2
-        assert any("Python是一种编程语言" in p.content for p in results)
-        assert any("什么是Python" in p.content for p in results)
+        contents = {p.content for p in results}
+        assert "Python是一种编程语言" in contents
+        assert "什么是Python？" in contents
 
         # 搜索包含"编程语言"的问题
         results = await search_problem(session, "编程语言")
         assert len(results) == 3  # 所有问题都包含"编程语言"
 
-        # 测试分页
-        results_page1 = await search_problem(session, "编程语言", page=1, page_size=2)
-        results_page2 = await search_problem(session, "编程语言", page=2, page_size=2)
-        assert len(results_page1) == 2
-        assert len(results_page2) == 1
-        assert results_page1 + results_page2 == results
+        # 测试分页; SQLite 下 "编程语言" 走 FTS, 不足 3 字的 "编程" 走 LIKE,
+        # 其他数据库两者都走 LIKE (PostgreSQL 下由 pg_trgm 索引支撑)
+        for kw in ("编程语言", "编程"):
+            results = await search_problem(session, kw)
+            assert len(results) == 3
+            page1 = await search_problem(session, kw, page=1, page_size=2)
+            page2 = await search_problem(session, kw, page=2, page_size=2)
+            # 结果按 id 排序, 两页合起来与不分页的结果一致
+            assert page1 + page2 == results
+            assert [p.id for p in results] == sorted(p.id for p in results)
+
+            # keyset 分页与 OFFSET 分页得到同一页
+            after = await search_problem(
+                session, kw, page_size=2, after_id=page1[-1].id
+            )
+            assert after == page2
+
+
+async def test_search_uses_fts_index(
+    test_engine: AsyncEngine,
+    test_session_getter: SessionGetterType,
+    init_problemset_uuid: UUID,
+) -> None:
+    """SQLite 下关键词搜索应走 FTS5 索引, 且索引随增改删同步"""
+    if test_engine.dialect.name != "sqlite":
+        pytest.skip("FTS5 仅在 SQLite 下启用")
+    async with test_session_getter() as session:
+        problem_ids = await add_problems(
+            session,
+            init_problemset_uuid,
+            ProblemSubmit(
+                content="全文检索的题干",
+                type=ProblemType.single_select,
+                options=[
+                    OptionSubmit(is_correct=True, order=0, content="三元分词"),
+                    OptionSubmit(is_correct=False, order=1, content="整句匹配"),
+                ],
+            ),
+        )
+    assert problem_ids is not None
+    (problem_id,) = problem_ids
+
+    statements: list[tuple[str, Any]] = []
+
+    def capture(_conn: Any, _cursor: Any, statement: str, params: Any, *_: Any) -> None:
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, params))
+
+    async with test_session_getter() as session:
+        event.listen(test_engine.sync_engine, "before_cursor_execute", capture)
+        try:
+            results = await search_problem(session, "全文检索")
+        finally:
+            event.remove(test_engine.sync_engine, "before_cursor_execute", capture)
+        assert [p.id for p in results] == [problem_id]
+        assert [p.id for p in await search_problem(session, "三元分词")] == [problem_id]
+
+        statement, params = statements[0]
+        conn = await session.connection()
+        plan = (
+            await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", params)
+        ).all()
+        assert any("VIRTUAL TABLE INDEX" in row[-1] for row in plan)
+
+        problem = await session.get_one(DBProblem, problem_id)
+        problem.content = "改过的题干"
+        await session.commit()
+        assert await search_problem(session, "全文检索") == []
+        assert [p.id for p in await search_problem(session, "改过的题干")] == [
+            problem_id
+        ]
+
+        await delete_problems(session, problem_id)
+        assert await search_problem(session, "三元分词") == []
+
+
+async def test_fts_survives_rowid_change(
+    test_engine: AsyncEngine,
+    test_session_getter: SessionGetterType,
+    init_problemset_uuid: UUID,
+) -> None:
+    """原表 rowid 被重排 (如 VACUUM) 后, 全文索引仍然对得上"""
+    if test_engine.dialect.name != "sqlite":
+        pytest.skip("FTS5 仅在 SQLite 下启用")
+    async with test_session_getter() as session:
+        problem_ids = await add_problems(
+            session,
+            init_problemset_uuid,
+            ProblemSubmit(
+                content="重排行号的题干",
+                type=ProblemType.single_select,
+                options=[OptionSubmit(is_correct=True, order=0, content="重排的选项")],
+            ),
+        )
+        assert problem_ids is not None
+        # 直接改 rowid 不会触发同步触发器, 模拟 VACUUM 重排 rowid 的效果
+        conn = await session.connection()
+        for name in (DBProblem.__tablename__, DBOption.__tablename__):
+            await conn.exec_driver_sql(f'UPDATE "{name}" SET rowid = rowid + 100000')
+        await session.commit()
+
+        for kw in ("重排行号", "重排的选项"):
+            assert [p.id for p in await search_problem(session, kw)] == problem_ids
+
+        await delete_problems(session, *problem_ids)
+        assert await search_problem(session, "重排行号") == []
+        assert await search_problem(session, "重排的选项") == []
 
 
 async def test_delete_problems(
@@ -304,17 +441,7 @@ async def test_sample_problems(
     """测试随机抽样功能"""
     async with test_session_getter() as session:
         # 添加多个问题
-        problems = []
-        for i in range(50):
-            problems.append(
-                ProblemSubmit(
-                    content=f"问题{i}",
-                    type=ProblemType.single_select,
-                    options=[
-                        OptionSubmit(is_correct=True, order=0, content=f"答案{i}")
-                    ],
-                )
-            )
+        problems = [trusted_problem(f"问题{i}", (f"答案{i}", True)) for i in range(50)]
 
         await add_problems(session, init_problemset_uuid, *problems)
         await session.commit()
@@ -523,9 +650,14 @@ async def test_answer_record_operations(
         # 测试报告答题尝试（错误）
         await report_attempt(session, problem_id, user, correct=False)
 
-        # 测试多次答题
-        for i in range(5):
-            await report_attempt(session, problem_id, user, correct=i % 2 == 0)
+        # 测试多次答题, 一次性上报
+        await report_attempts(
+            session, user, [(problem_id, i % 2 == 0) for i in range(5)]
+        )
+
+        record = await session.get_one(DBAnswerRecord, (user, problem_id))
+        assert record.total_count == 7
+        assert record.correct_count == 4
 
 
 async def test_advanced_search_operations(
@@ -599,35 +731,32 @@ async def test_advanced_search_operations(
             all_ids.add(p.id)
 
 
-async def test_concurrent_operations(
+async def test_batched_add(
     test_session_getter: SessionGetterType, init_problemset_uuid: UUID
 ) -> None:
-    """测试并发操作"""
-
-    async def add_problems_batch(batch_id: int) -> None:
-        async with test_session_getter() as session:
-            problems = []
-            for i in range(10):
-                problems.append(
-                    ProblemSubmit(
-                        content=f"批次{batch_id}问题{i}",
-                        type=ProblemType.single_select,
-                        options=[
-                            OptionSubmit(
-                                is_correct=True, order=0, content=f"正确答案{i}"
-                            ),
-                            OptionSubmit(
-                                is_correct=False, order=1, content=f"错误答案{i}"
-                            ),
-                        ],
-                    )
-                )
-            await add_problems(session, init_problemset_uuid, *problems)
-            await session.commit()
+    """测试多批题目合并成一次 add_problems 写入"""
 
-    # 并发添加问题
-    tasks = [add_problems_batch(i) for i in range(5)]
-    await asyncio.gather(*tasks)
+    def build_batch(batch_id: int) -> list[ProblemSubmit]:
+        return [
+            ProblemSubmit(
+                content=f"批次{batch_id}问题{i}",
+                type=ProblemType.single_select,
+                options=[
+                    OptionSubmit(is_correct=True, order=0, content=f"正确答案{i}"),
+                    OptionSubmit(is_correct=False, order=1, content=f"错误答案{i}"),
+                ],
+            )
+            for i in range(10)
+        ]
+
+    # 构造题目是纯 CPU 操作, 放进线程也不会并行, 且线程无法被取消; 直接顺序构造
+    # SQLite 只有一个写者, 分多个事务并发写只会互相排队, 合并成一次写入
+    async with test_session_getter() as session:
+        await add_problems(
+            session,
+            init_problemset_uuid,
+            *itertools.chain.from_iterable(build_batch(i) for i in range(5)),
+        )
 
     async with test_session_getter() as session:
         total_count = await get_problem_count(session)
@@ -701,20 +830,17 @@ async def test_problemset_operations_extended(
         assert status2 == ProblemSetCreateStatus.SUCCESS
         assert status3 == ProblemSetCreateStatus.SUCCESS
 
-        # 为每个问题集添加不同数量的问题
+        # 为每个问题集添加不同数量的问题, 各集取同一批题目的前 count 道
+        problems = [
+            ProblemSubmit(
+                content=f"问题{i}",
+                type=ProblemType.single_select,
+                options=[OptionSubmit(is_correct=True, order=0, content=f"答案{i}")],
+            )
+            for i in range(15)
+        ]
         for ps_id, count in [(ps1_id, 10), (ps2_id, 5), (ps3_id, 15)]:
-            problems = []
-            for i in range(count):
-                problems.append(
-                    ProblemSubmit(
-                        content=f"问题{i}",
-                        type=ProblemType.single_select,
-                        options=[
-                            OptionSubmit(is_correct=True, order=0, content=f"答案{i}")
-                        ],
-                    )
-                )
-            await add_problems(session, ps_id, *problems)
+            await add_problems(session, ps_id, *problems[:count])
         await session.commit()
 
         # 测试列出所有问题集
@@ -747,7 +873,7 @@ async def test_edge_cases_and_error_handling(
 
     async with test_session_getter() as session:
         # 测试对不存在的问题集添加问题
-        fake_problemset_id = uuid4()
+        fake_problemset_id = fake_uuid()
         result = await add_problems(
             session,
             fake_problemset_id,
@@ -760,7 +886,7 @@ async def test_edge_cases_and_error_handling(
         assert result is None  # 应该返回 None
 
         # 测试查询不存在的问题
-        fake_problem_id = uuid4()
+        fake_problem_id = fake_uuid()
         problem = await query_problem(session, fake_problem_id)
         assert problem is None
 
@@ -886,60 +1012,48 @@ async def test_performance_and_bulk_operations(
 
     async with test_session_getter() as session:
         # 测试批量添加大量问题
-        start_time = time.time()
-
-        bulk_problems = []
-        for i in range(100):
-            bulk_problems.append(
-                ProblemSubmit(
-                    content=f"性能测试问题{i}",
-                    type=ProblemType.single_select,
-                    options=[
-                        OptionSubmit(is_correct=True, order=0, content=f"正确答案{i}"),
-                        OptionSubmit(
-                            is_correct=False, order=1, content=f"错误答案{i}a"
-                        ),
-                        OptionSubmit(
-                            is_correct=False, order=2, content=f"错误答案{i}b"
-                        ),
-                        OptionSubmit(
-                            is_correct=False, order=3, content=f"错误答案{i}c"
-                        ),
-                    ],
-                )
+        bulk_problems = [
+            trusted_problem(
+                f"性能测试问题{i}",
+                (f"正确答案{i}", True),
+                *((f"错误答案{i}{suffix}", False) for suffix in "abc"),
             )
+            for i in range(100)
+        ]
 
+        start_time = time.perf_counter()
         result = await add_problems(session, init_problemset_uuid, *bulk_problems)
         await session.commit()
 
-        print(f"添加100个问题耗时: {time.time() - start_time:.3f}秒")
+        print(f"添加100个问题耗时: {time.perf_counter() - start_time:.3f}秒")
 
         assert result is not None
         assert len(result) == 100
 
         # 测试批量搜索性能
-        start_time = time.time()
+        start_time = time.perf_counter()
         search_results = await search_problem(session, "性能测试", page_size=999)
-        search_time = time.time() - start_time
+        search_time = time.perf_counter() - start_time
 
         print(f"搜索100个问题耗时: {search_time:.3f}秒")
         assert len(search_results) == 100
 
-        # 测试分页搜索
+        # 测试分页搜索, 4页，每页25个; 分页本身才是要测的, 不在内存里切片
         paginated_results = []
-        for page in range(1, 11):  # 10页，每页10个
+        for page in range(1, 5):
             page_results = await search_problem(
-                session, "性能测试", page=page, page_size=10
+                session, "性能测试", page=page, page_size=25
             )
             paginated_results.extend(page_results)
 
         assert len(paginated_results) == 100
+        assert {p.id for p in paginated_results} == {p.id for p in search_results}
 
         # 测试批量删除
-        start_time = time.time()
+        start_time = time.perf_counter()
         await delete_problems(session, *result[:50])  # 删除前50个
         await session.commit()
-        delete_time = time.time() - start_time
+        delete_time = time.perf_counter() - start_time
 
         print(f"删除50个问题耗时: {delete_time:.3f}秒")
 
@@ -1006,12 +1120,24 @@ async def test_unicode_and_special_characters(
                     OptionSubmit(is_correct=False, order=1, content="Hello"),
                 ],
             ),
+            # 以 NFD (分解形式) 提交, 入库时应统一成 NFC
+            ProblemSubmit(
+                content=unicodedata.normalize("NFD", "Café au lait"),
+                type=ProblemType.single_select,
+                options=[
+                    OptionSubmit(
+                        is_correct=True,
+                        order=0,
+                        content=unicodedata.normalize("NFD", "Crème brûlée"),
+                    ),
+                ],
+            ),
         ]
 
         result = await add_problems(session, init_problemset_uuid, *unicode_problems)
         await session.commit()
         assert result is not None
-        assert len(result) == 4
+        assert len(result) == len(unicode_problems)
 
         # 测试Unicode搜索
         math_results = await search_problem(session, "数学")
@@ -1026,13 +1152,22 @@ async def test_unicode_and_special_characters(
         russian_results = await search_problem(session, "Русский")
         assert len(russian_results) >= 1
 
+        # NFC 关键词能命中 NFD 提交的题干和选项
+        assert len(await search_problem(session, "Café")) == 1
+        assert len(await search_problem(session, "brûlée")) == 1
+
         # 验证存储和检索的完整性
-        for problem_id in result:
-            retrieved_problem = await query_problem(session, problem_id)
-            assert retrieved_problem is not None
+        retrieved_problems = await query_problems(session, *result)
+        assert len(retrieved_problems) == len(result)
+        for retrieved_problem in retrieved_problems:
             # 验证内容没有被截断或损坏
             assert len(retrieved_problem.content) > 0
             assert len(retrieved_problem.options) > 0
+            assert unicodedata.is_normalized("NFC", retrieved_problem.content)
+            assert all(
+                unicodedata.is_normalized("NFC", o.content)
+                for o in retrieved_problem.options
+            )
 
 
 async def test_database_integrity_and_relationships(
@@ -1077,10 +1212,14 @@ async def test_database_integrity_and_relationships(
         await session.commit()
 
         # 验证选项也被删除了
-        remaining_options = (
-            await session.exec(select(DBOption).where(col(DBOption.id).in_(option_ids)))
-        ).all()
-        assert len(remaining_options) == 0
+        remaining_count = (
+            await session.exec(
+                select(func.count())
+                .select_from(DBOption)
+                .where(col(DBOption.id).in_(option_ids))
+            )
+        ).one()
+        assert remaining_count == 0
 
 
 async def test_problem_sampling_variations(
@@ -1089,27 +1228,21 @@ async def test_problem_sampling_variations(
     """测试问题抽样的各种情况"""
     async with test_session_getter() as session:
         # 添加不同类型的问题
-        mixed_problems = []
-        for i in range(20):
-            problem_type = (
-                ProblemType.single_select if i % 2 == 0 else ProblemType.multi_select
-            )
-            options = [
-                OptionSubmit(is_correct=True, order=0, content=f"正确答案{i}"),
-                OptionSubmit(is_correct=False, order=1, content=f"错误答案{i}"),
-            ]
-            if problem_type == ProblemType.multi_select:
-                options.append(
-                    OptionSubmit(is_correct=True, order=2, content=f"另一个正确答案{i}")
-                )
-
-            mixed_problems.append(
-                ProblemSubmit(
-                    content=f"抽样测试问题{i}",
-                    type=problem_type,
-                    options=options,
-                )
+        # 偶数号为单选题, 奇数号为多选题并多一个正确选项
+        mixed_problems = [
+            trusted_problem(
+                f"抽样测试问题{i}",
+                (f"正确答案{i}", True),
+                (f"错误答案{i}", False),
+                *([(f"另一个正确答案{i}", True)] if i % 2 else []),
+                type=(
+                    ProblemType.single_select
+                    if i % 2 == 0
+                    else ProblemType.multi_select
+                ),
             )
+            for i in range(20)
+        ]
 
         await add_problems(session, init_problemset_uuid, *mixed_problems)
         await session.commit()
@@ -1247,12 +1380,90 @@ async def test_data_consistency_after_operations(
         assert remaining_problem.content == "一致性测试问题2"
 
         # 验证删除的问题确实不存在了
-        deleted_problem1 = await query_problem(session, problem_ids[0])
-        deleted_problem3 = await query_problem(session, problem_ids[2])
-        assert deleted_problem1 is None
-        assert deleted_problem3 is None
+        assert await query_problems(session, problem_ids[0], problem_ids[2]) == []
 
         # 搜索验证
         search_results = await search_problem(session, "一致性测试")
         assert len(search_results) == 1
         assert search_results[0].content == "一致性测试问题2"
+
+
+@pytest.fixture
+async def committing_engine() -> AsyncGenerator[AsyncEngine]:
+    """独立的内存库, 提交会真正落库, 用于验证事务边界"""
+    engine = new_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+async def _problemset_names(engine: AsyncEngine) -> set[str]:
+    async with get_session(engine) as session:
+        return set((await session.exec(select(DBProblemSet.name))).all())
+
+
+async def test_write_after_read_is_atomic(committing_engine: AsyncEngine) -> None:
+    """先读 (自动开启事务) 再写, 写入嵌套在该事务里, 由会话的持有者提交或回滚"""
+    async with get_session(committing_engine) as session:
+        await list_problemset(session)
+        await create_problemset(session, "回滚的写入")
+        await session.rollback()
+        await list_problemset(session)
+        await create_problemset(session, "提交的写入")
+        await session.commit()
+    assert await _problemset_names(committing_engine) == {"提交的写入"}
+
+
+async def test_auto_begin_rollback_keeps_committed(
+    committing_engine: AsyncEngine,
+) -> None:
+    """auto_begin 内出错只回滚本次写入, 不影响之前已提交的数据"""
+    async with get_session(committing_engine) as session:
+        await create_problemset(session, "已提交")
+        with pytest.raises(RuntimeError):
+            async with auto_begin(session):
+                session.add(DBProblemSet(name="被回滚"))
+                await session.flush()
+                raise RuntimeError
+    assert await _problemset_names(committing_engine) == {"已提交"}
+
+
+async def test_auto_begin_nested_rollback(committing_engine: AsyncEngine) -> None:
+    """显式事务内的 auto_begin 走 SAVEPOINT, 出错只回滚到保存点"""
+    async with get_session(committing_engine) as session:
+        async with session.begin():
+            session.add(DBProblemSet(name="外层"))
+            await session.flush()
+            with pytest.raises(RuntimeError):
+                async with auto_begin(session, auto_rollback=False):
+                    session.add(DBProblemSet(name="保存点"))
+                    await session.flush()
+                    raise RuntimeError
+    assert await _problemset_names(committing_engine) == {"外层"}
+
+
+async def test_auto_begin_keeps_pending_changes(
+    committing_engine: AsyncEngine,
+) -> None:
+    """调用方未提交的改动不会被 auto_begin 顺带提交"""
+    async with get_session(committing_engine) as session:
+        await list_problemset(session)
+        session.add(DBProblemSet(name="未提交"))
+        await create_problemset(session, "随后写入")
+        assert session.in_transaction()
+    assert await _problemset_names(committing_engine) == set()
+
+
+async def test_outer_rollback_discards_savepoint(
+    committing_engine: AsyncEngine,
+) -> None:
+    """外层事务回滚时, 其中已释放的 SAVEPOINT 写入一并撤销"""
+    async with get_session(committing_engine) as session:
+        with pytest.raises(RuntimeError):
+            async with session.begin():
+                async with auto_begin(session):
+                    session.add(DBProblemSet(name="保存点"))
+                    await session.flush()
+                raise RuntimeError
+    assert await _problemset_names(committing_engine) == set()